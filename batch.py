@@ -0,0 +1,150 @@
+"""Headless batch meal planning for a roster of profiles.
+
+Usage:
+    python batch.py profiles.jsonl plans.jsonl --concurrency 4
+
+Each input row needs a profile and a list of ingredients (JSONL objects or
+CSV columns: id, profile, goal, ingredients). One JSON line per planned
+profile is appended to the output as soon as it is ready; rows already in
+the output are skipped, so an interrupted run can simply be restarted.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from planner import DISH_SHARDS, NutritionPlanner, TokenBucket
+
+
+def read_profiles(path):
+    """Yield profile rows from a JSONL or CSV file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for line_no, row in enumerate(rows, 1):
+            ingredients = row.get("ingredients", [])
+            if isinstance(ingredients, str):
+                ingredients = [i.strip() for i in ingredients.split(",") if i.strip()]
+            row_id = row.get("id")
+            if row_id is None or row_id == "":
+                row_id = line_no
+            yield {
+                "id": str(row_id),
+                "profile": row.get("profile", ""),
+                "goal": row.get("goal") or "general health",
+                "ingredients": ingredients
+            }
+
+
+def load_checkpoint(path):
+    """Ids already written to the output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # partially written last line
+    return done
+
+
+def plan_profile(planner, row, top_k):
+    """Run the profile -> goals -> dishes pipeline for one row"""
+    goals = planner.analyze_profile(row["profile"], row["goal"])
+    _, top = planner.generate_dishes(row["ingredients"], goals, top_k)
+    return {
+        "id": row["id"],
+        "goal": row["goal"],
+        "nutrition_goals": goals,
+        "dishes": top
+    }
+
+
+def run(planner, input_path, output_path, concurrency=4, top_k=12):
+    """Plan every pending profile and append results to output_path"""
+    done = load_checkpoint(output_path)
+    pending = [row for row in read_profiles(input_path) if row["id"] not in done]
+    print(f"{len(done)} already planned, {len(pending)} to go", file=sys.stderr)
+
+    write_lock = threading.Lock()
+    start = time.time()
+    tokens_start = planner.llm.tokens_used
+    completed = failed = 0
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(plan_profile, planner, row, top_k): row for row in pending}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Not checkpointed, so the next run retries it
+                failed += 1
+                print(f"[{row['id']}] failed: {e}", file=sys.stderr)
+                continue
+
+            with write_lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+            completed += 1
+
+            elapsed = max(time.time() - start, 1e-9)
+            tokens = planner.llm.tokens_used - tokens_start
+            print(
+                f"{completed}/{len(pending)} planned  "
+                f"{completed / elapsed:.2f} profiles/s  {tokens / elapsed:.0f} tokens/s",
+                file=sys.stderr
+            )
+
+    elapsed = max(time.time() - start, 1e-9)
+    stats = {
+        "planned": completed,
+        "failed": failed,
+        "skipped": len(done),
+        "seconds": round(elapsed, 2),
+        "profiles_per_second": round(completed / elapsed, 3),
+        "tokens": planner.llm.tokens_used - tokens_start,
+        "tokens_per_second": round((planner.llm.tokens_used - tokens_start) / elapsed, 1),
+        "cache": planner.response_cache.stats(),
+        "counters": dict(planner.counters),
+        "prompts": {name: dict(stats) for name, stats in planner.prompt_stats.items()}
+    }
+    print(json.dumps(stats), file=sys.stderr)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan meals for many profiles without the GUI")
+    parser.add_argument("input", help="profiles as .jsonl or .csv")
+    parser.add_argument("output", help="ranked dishes as .jsonl (also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="profiles planned in parallel")
+    parser.add_argument("--top-k", type=int, default=12, help="dishes kept per profile")
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY", ""))
+    parser.add_argument("--llm-url", default="https://api.groq.com/openai/v1")
+    parser.add_argument("--cache", default="dna_buddy_cache.db", help="response cache file")
+    parser.add_argument("--rate", type=float, default=0.5, help="max LLM requests per second")
+    args = parser.parse_args(argv)
+
+    # Each profile's dish generation runs DISH_SHARDS upstream requests at once
+    planner = NutritionPlanner(args.api_key, base_url=args.llm_url, cache_path=args.cache,
+                               pool_size=max(1, args.concurrency) * DISH_SHARDS)
+    planner.rate_limiter = TokenBucket(rate=args.rate, capacity=max(1, args.concurrency))
+    try:
+        run(planner, args.input, args.output, args.concurrency, args.top_k)
+    finally:
+        planner.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2297 @@
+"""DNA Buddy planning engine (no GUI dependencies)"""
+
+import requests
+import json
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import queue
+import random
+import heapq
+import bisect
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict, deque
+from requests.adapters import HTTPAdapter
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to the pure-Python implementation
+    np = None
+
+RECIPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes.json")
+
+# Structured output schema for profile analysis
+PROFILE_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "nutrition_plan",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "calories": {"type": "number"},
+                "protein": {"type": "number"},
+                "carbs": {"type": "number"},
+                "fats": {"type": "number"},
+                "exercise_plan": {"type": "string"}
+            },
+            "required": ["calories", "protein", "carbs", "fats", "exercise_plan"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Plausible daily ranges, checked locally since not every endpoint enforces
+# numeric bounds in the schema
+PROFILE_LIMITS = {
+    "calories": (1000, 6000), "protein": (20, 500),
+    "carbs": (0, 1000), "fats": (10, 400)
+}
+
+DEFAULT_GOALS = {
+    "calories": 2000.0, "protein": 150.0, "carbs": 200.0,
+    "fats": 65.0, "exercise_plan": "Regular exercise recommended"
+}
+
+# LLM dish generation is split into this many parallel requests
+DISH_SHARDS = 4
+
+
+def extract_json_object(text, required=()):
+    """First JSON object in text (prose, code fences or trailing output around it are skipped)"""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict) and all(field in obj for field in required):
+            return obj
+        start = text.find("{", start + 1)
+    raise ValueError("no JSON object found in response")
+
+
+class LLMClient:
+    """Long-lived pooled HTTP transport for the chat completions API"""
+
+    def __init__(self, api_key, base_url="https://api.groq.com/openai/v1",
+                 pool_size=4, keep_alive=True, connect_timeout=5, read_timeout=60):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # Usage counters reported by the API
+        self.requests_sent = 0
+        self.tokens_used = 0
+        self.usage_lock = threading.Lock()
+
+        # One session for the whole app so TCP/TLS connections get reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Connection": "keep-alive" if keep_alive else "close"
+        })
+
+    def chat_completion(self, data):
+        """POST a chat completion request and return the parsed JSON body"""
+        self._count_request()
+        response = self.session.post(
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json=data,
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        response.raise_for_status()
+        result = response.json()
+        self._record_usage(result.get("usage"))
+        return result
+
+    def stream_chat_completion(self, data):
+        """POST a streaming chat completion and yield content deltas from the SSE stream"""
+        self._count_request()
+        with self.session.post(
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json=dict(data, stream=True),
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                # Groq reports usage on the last chunk under x_groq
+                self._record_usage(chunk.get("usage") or chunk.get("x_groq", {}).get("usage"))
+                choices = chunk.get("choices") or []
+                if choices:
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+
+    def _count_request(self):
+        """Count an upstream request"""
+        with self.usage_lock:
+            self.requests_sent += 1
+
+    def _record_usage(self, usage):
+        """Add a response's token usage to the counters"""
+        if not usage:
+            return
+        with self.usage_lock:
+            self.tokens_used += usage.get("total_tokens", 0)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+class RetryPolicy:
+    """Classifies LLM errors and computes backoff delays"""
+
+    RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+    def __init__(self, retries=3, base_delay=1.0, max_delay=30.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, error):
+        """Timeouts, dropped connections, 429s, 5xx and malformed bodies are worth retrying"""
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return status in self.RETRYABLE_STATUS or (status is not None and status >= 500)
+        return isinstance(error, (requests.Timeout, requests.ConnectionError, ValueError, KeyError, IndexError))
+
+    def delay(self, attempt, error=None):
+        """Seconds to wait before the next attempt, or None if the server hint is too long"""
+        hint = self.server_hint(error)
+        if hint is not None and hint > self.max_delay:
+            return None
+
+        # Exponential backoff with full jitter, never shorter than the server asked for
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, hint or 0.0)
+
+    @staticmethod
+    def server_hint(error):
+        """Wait time from Retry-After or Groq x-ratelimit-reset-* headers"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+        # Durations like "7.66s", "2m59.56s" or "120ms"
+        hints = []
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+            value = headers.get(name)
+            if not value:
+                continue
+            seconds = 0.0
+            for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+                seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+            hints.append(seconds)
+        if response.status_code == 429 and hints:
+            return max(hints)
+        return None
+
+
+class TokenBucket:
+    """Client-side rate limiter shared by all LLM calls"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every caller for a while (after the server rate-limits us)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class PromptBudget:
+    """Offline token estimates and input/output budgets for one kind of request"""
+
+    PIECE = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, name, max_input_tokens, max_output_tokens):
+        self.name = name
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens  # sent as max_tokens
+
+    @classmethod
+    def estimate(cls, text):
+        """Approximate BPE token count: punctuation is one token, words about four characters each"""
+        return sum((len(piece) + 3) // 4 for piece in cls.PIECE.findall(text))
+
+    @classmethod
+    def truncate(cls, text, max_tokens):
+        """Longest prefix of text estimated at no more than max_tokens"""
+        used = 0
+        end = 0
+        for match in cls.PIECE.finditer(text):
+            used += (len(match.group()) + 3) // 4
+            if used > max_tokens:
+                return text[:end]
+            end = match.end()
+        return text
+
+    @classmethod
+    def take(cls, items, max_tokens, separator=", "):
+        """Leading items whose joined text fits in max_tokens"""
+        taken = []
+        used = 0
+        for item in items:
+            cost = cls.estimate(item) + (cls.estimate(separator) if taken else 0)
+            if used + cost > max_tokens:
+                break
+            taken.append(item)
+            used += cost
+        return taken
+
+    def fill(self, sections, max_tokens=None):
+        """Join (priority, text, truncatable) sections in their given order, admitting
+        them by priority (0 first) until the input budget is spent"""
+        remaining = self.max_input_tokens if max_tokens is None else max_tokens
+        chosen = {}
+        for i in sorted(range(len(sections)), key=lambda i: sections[i][0]):
+            _, text, truncatable = sections[i]
+            cost = self.estimate(text)
+            if cost > remaining:
+                if not truncatable or remaining <= 0:
+                    continue
+                text = self.truncate(text, remaining)
+                cost = self.estimate(text)
+            chosen[i] = text
+            remaining -= cost
+        return "".join(chosen[i] for i in sorted(chosen))
+
+
+class ResponseCache:
+    """LRU + TTL cache for LLM responses with an optional SQLite tier
+
+    The disk tier drops expired rows and keeps only the newest max_rows,
+    on open and again every prune_every writes.
+    """
+
+    def __init__(self, max_entries=256, ttl=24 * 3600, path=None, max_rows=10000, prune_every=100):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self.entries = OrderedDict()  # key -> (timestamp, response)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0  # disk writes since the last prune
+        self.lock = threading.Lock()
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, created REAL, response TEXT)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._prune()
+
+    @staticmethod
+    def make_key(prompt, model, temperature):
+        """Content address for a prompt: normalized text + model + temperature"""
+        normalized = " ".join(prompt.split()).lower()
+        raw = json.dumps([normalized, model, temperature])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return a cached response or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT created, response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[0] < self.ttl:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    return row[1]
+                if row:
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        """Store a response in memory and on disk"""
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, response)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                    (key, now, response)
+                )
+                self.writes += 1
+                if self.writes >= self.prune_every:
+                    self._prune()
+                else:
+                    self.db.commit()
+
+    def _prune(self):
+        """Delete expired rows and all but the newest max_rows (lock held or during init)"""
+        self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self.db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+            (self.max_rows,)
+        )
+        self.db.commit()
+        self.writes = 0
+
+    def _remember(self, key, created, response):
+        """Insert into the in-memory LRU, evicting the oldest entry if full"""
+        self.entries[key] = (created, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+    def close(self):
+        """Close the disk tier"""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+class SessionStore:
+    """SQLite store of user sessions (goals, dishes, chat) with a background writer
+
+    Writes are queued and applied by one thread, coalescing repeated saves of
+    the same value; reads use their own connection, so callers never wait on
+    a write. Only the newest keep_sessions sessions are kept.
+    """
+
+    def __init__(self, path, keep_sessions=5, max_messages=500):
+        self.path = path
+        self.keep_sessions = keep_sessions
+        self.max_messages = max_messages  # newest chat messages kept per session
+        self.session_id = None
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created REAL, updated REAL);"
+            "CREATE TABLE IF NOT EXISTS session_values "
+            "(session_id TEXT, key TEXT, value TEXT, PRIMARY KEY (session_id, key));"
+            "CREATE TABLE IF NOT EXISTS messages "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, role TEXT, content TEXT);"
+            "CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);"
+        )
+        self.db.commit()
+        self.lock = threading.Lock()  # guards the reader connection
+
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        self.compact()
+
+    def new_session(self):
+        """Start a new session; later saves go to it"""
+        self.session_id = f"{time.time():.6f}-{random.getrandbits(32):08x}"
+        self.writes.put(("session", self.session_id, time.time()))
+        return self.session_id
+
+    def save(self, key, value):
+        """Queue a JSON-serializable value for the current session"""
+        if self.session_id is None:
+            self.new_session()
+        self.writes.put(("value", self.session_id, key, json.dumps(value)))
+
+    def append_message(self, role, content):
+        """Queue a chat message for the current session"""
+        if self.session_id is None:
+            self.new_session()
+        self.writes.put(("message", self.session_id, role, content))
+
+    def clear_messages(self):
+        """Queue deletion of the current session's chat"""
+        if self.session_id is not None:
+            self.writes.put(("clear", self.session_id))
+
+    def compact(self):
+        """Queue removal of old sessions and old chat messages"""
+        self.writes.put(("compact",))
+
+    def latest(self, keys=None):
+        """Values of the most recent session (and make it current); None if there is none"""
+        with self.lock:
+            row = self.db.execute("SELECT id FROM sessions ORDER BY updated DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            rows = self.db.execute(
+                "SELECT key, value FROM session_values WHERE session_id = ?", (row[0],)
+            ).fetchall()
+        if self.session_id is None:
+            self.session_id = row[0]
+        return {key: json.loads(value) for key, value in rows if keys is None or key in keys}
+
+    def messages(self, session_id=None):
+        """Chat messages of a session (the current one by default), oldest first"""
+        session_id = session_id or self.session_id
+        if session_id is None:
+            return []
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, self.max_messages)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def _write_loop(self):
+        """Apply queued writes in batches until close()"""
+        db = sqlite3.connect(self.path)
+        while True:
+            batch = [self.writes.get()]
+            while True:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Only the last save of each value in a batch needs writing
+            last_save = {}
+            for position, item in enumerate(batch):
+                if item is not None and item[0] == "value":
+                    last_save[item[1:3]] = position
+
+            stop = False
+            try:
+                with db:
+                    for position, item in enumerate(batch):
+                        if item is None:
+                            stop = True
+                        elif item[0] != "value" or last_save[item[1:3]] == position:
+                            self._apply(db, item)
+            except sqlite3.Error:
+                pass  # persistence is best effort; the app keeps its state in memory
+            if stop:
+                break
+        db.close()
+
+    def _apply(self, db, item):
+        kind, now = item[0], time.time()
+        if kind == "session":
+            db.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?)", (item[1], item[2], item[2]))
+        elif kind == "value":
+            db.execute("INSERT OR REPLACE INTO session_values VALUES (?, ?, ?)", item[1:])
+        elif kind == "message":
+            db.execute("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", item[1:])
+        elif kind == "clear":
+            db.execute("DELETE FROM messages WHERE session_id = ?", (item[1],))
+        elif kind == "compact":
+            stale = [row[0] for row in db.execute(
+                "SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?", (self.keep_sessions,)
+            )]
+            for session_id in stale:
+                db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                db.execute("DELETE FROM session_values WHERE session_id = ?", (session_id,))
+                db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            db.execute(
+                "DELETE FROM messages WHERE id NOT IN (SELECT id FROM messages AS m "
+                "WHERE m.session_id = messages.session_id ORDER BY id DESC LIMIT ?)",
+                (self.max_messages,)
+            )
+            return
+        if kind != "session":
+            db.execute("UPDATE sessions SET updated = ? WHERE id = ?", (now, item[1]))
+
+    def close(self):
+        """Flush pending writes and close the database"""
+        self.writes.put(None)
+        self.writer.join(timeout=5)
+        with self.lock:
+            self.db.close()
+
+
+class IngredientCanonicalizer:
+    """Maps free-form ingredient text to canonical names, interned ids and bitsets
+
+    "Chicken", "chicken breast " and "2 lbs boneless chickens" all become
+    "chicken": quantities and descriptors are dropped, words singularized and
+    synonyms mapped through a small lexicon. Only recipe matching (match()
+    and bits()) reduces unknown phrases to their longest known suffix
+    ("basmati rice" -> "rice"); names and keys keep the whole phrase, so
+    "almond milk" and "milk" stay different ingredients.
+    """
+
+    SYNONYMS = {
+        "chicken breast": "chicken", "chicken thigh": "chicken", "chicken drumstick": "chicken",
+        "chicken wing": "chicken", "ground beef": "beef", "beef mince": "beef", "steak": "beef",
+        "ground turkey": "turkey", "turkey breast": "turkey", "pork chop": "pork", "pork loin": "pork",
+        "prawn": "shrimp", "salmon fillet": "salmon", "garbanzo": "chickpea", "garbanzo bean": "chickpea",
+        "scallion": "green onion", "spring onion": "green onion", "courgette": "zucchini",
+        "aubergine": "eggplant", "capsicum": "bell pepper", "red pepper": "bell pepper",
+        "green pepper": "bell pepper", "coriander": "cilantro", "yoghurt": "yogurt",
+        "greek yoghurt": "greek yogurt", "oatmeal": "oat", "spaghetti": "pasta", "penne": "pasta",
+        "macaroni": "pasta", "fusilli": "pasta", "egg white": "egg", "evoo": "olive oil",
+        "blueberry": "berry", "strawberry": "berry", "raspberry": "berry", "romaine": "lettuce",
+        "cheddar cheese": "cheddar", "parmesan cheese": "parmesan", "mozzarella cheese": "mozzarella",
+        "feta cheese": "feta", "ramen": "noodle", "soba": "noodle", "udon": "noodle",
+        "whey": "protein powder", "whey protein": "protein powder", "garlic clove": "garlic"
+    }
+    DESCRIPTORS = {
+        "fresh", "frozen", "raw", "cooked", "chopped", "diced", "sliced", "minced", "grated",
+        "shredded", "boneless", "skinless", "organic", "large", "small", "medium", "lean",
+        "canned", "dried", "grilled", "roasted", "baked", "boiled", "steamed", "firm", "extra",
+        "virgin", "rolled", "of", "some", "a", "an"
+    }
+    UNITS = {
+        "g", "gram", "kg", "lb", "oz", "ml", "l", "cup", "tbsp", "tsp", "can", "pack",
+        "bunch", "handful", "piece", "slice", "clove"
+    }
+
+    def __init__(self, known=(), max_names=4096):
+        self.known = set(self.SYNONYMS.values())
+        self.cache = {}  # raw text -> canonical name
+        self.matches = {}  # raw text -> name used for recipe matching
+        self.ids = {}  # canonical name -> interned id
+        self.names = []  # interned id -> canonical name
+        self.max_names = max_names  # cap on interned names outside the vocabulary
+        self.lock = threading.Lock()
+        for name in known:
+            self.learn(name)
+
+    def learn(self, text):
+        """Add an ingredient to the known vocabulary (as a whole phrase) and return its name"""
+        name = self._phrase(text)[0]
+        if name and name not in self.known:
+            self.known.add(name)
+            self.matches.clear()
+            self.intern(name)
+        return name
+
+    def canonical(self, text):
+        """Canonical ingredient name ('' if nothing is left)"""
+        cached = self.cache.get(text)
+        if cached is None:
+            cached = self._phrase(text)[0]
+            if len(self.cache) < 10000:
+                self.cache[text] = cached
+        return cached
+
+    def match(self, text):
+        """Name to match recipes on: the canonical name, or its longest known suffix"""
+        cached = self.matches.get(text)
+        if cached is not None:
+            return cached
+
+        name, words = self._phrase(text)
+        if name not in self.known:
+            # "green bell pepper" -> "bell pepper"
+            for start in range(1, len(words)):
+                suffix = " ".join(words[start:])
+                suffix = self.SYNONYMS.get(suffix, suffix)
+                if suffix in self.known:
+                    name = suffix
+                    break
+
+        if len(self.matches) < 10000:
+            self.matches[text] = name
+        return name
+
+    def _phrase(self, text):
+        """(lexicon name, words) of text without quantities, units and descriptors"""
+        words = [
+            word for word in re.sub(r"[\W\d_]+", " ", text.lower()).split()
+            if word not in self.DESCRIPTORS
+        ]
+        words = [
+            word for word in RecipeStore.normalize(" ".join(words)).split()
+            if word not in self.UNITS and word not in self.DESCRIPTORS
+        ]
+        phrase = " ".join(words)
+        return self.SYNONYMS.get(phrase, phrase), words
+
+    def canonical_set(self, ingredients, match=False):
+        """Sorted tuple of distinct canonical names (match names with match=True)"""
+        names = map(self.match if match else self.canonical, ingredients)
+        return tuple(sorted({name for name in names if name}))
+
+    def cache_key(self, ingredients):
+        """Deterministic key for an ingredient list (order, case and spelling insensitive)"""
+        return "|".join(self.canonical_set(ingredients))
+
+    def intern(self, name):
+        """Stable small integer id for a canonical name (None once max_names is reached)
+
+        Vocabulary names are always interned; other names only until the cap,
+        so arbitrary user input cannot grow the table without bound.
+        """
+        with self.lock:
+            ingredient_id = self.ids.get(name)
+            if ingredient_id is None:
+                if name not in self.known and len(self.names) >= self.max_names:
+                    return None
+                ingredient_id = self.ids[name] = len(self.names)
+                self.names.append(name)
+            return ingredient_id
+
+    def bits(self, ingredients, canonical=False):
+        """Bitset (int) of the ingredients' interned ids (raw text goes through match())"""
+        bits = 0
+        for ingredient in ingredients:
+            name = ingredient if canonical else self.match(ingredient)
+            ingredient_id = self.intern(name) if name else None
+            if ingredient_id is not None:
+                bits |= 1 << ingredient_id
+        return bits
+
+    @staticmethod
+    def count(bits):
+        """Number of ingredients in a bitset"""
+        return bin(bits).count("1")
+
+
+class RecipeStore:
+    """Bundled recipe database with an inverted ingredient -> recipe index"""
+
+    def __init__(self, path, canonicalizer=None):
+        self.recipes = []
+        self.index = {}  # canonical ingredient -> set of recipe ids
+        self.bits = []  # recipe id -> ingredient bitset
+        self.canonicalizer = canonicalizer or IngredientCanonicalizer()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for recipe in json.load(f):
+                    self.add(recipe)
+
+    @staticmethod
+    def normalize(ingredient):
+        """Lowercase and singularize an ingredient name"""
+        words = []
+        for word in ingredient.lower().split():
+            if word.endswith("ies"):
+                word = word[:-3] + "y"
+            elif word.endswith("oes"):
+                word = word[:-2]
+            elif word.endswith("s") and not word.endswith(("ss", "us")):
+                word = word[:-1]
+            words.append(word)
+        return " ".join(words)
+
+    def add(self, recipe):
+        """Add a recipe and index its ingredients"""
+        recipe_id = len(self.recipes)
+        self.recipes.append(recipe)
+        names = {self.canonicalizer.learn(ingredient) for ingredient in recipe["ingredients"]}
+        names.discard("")
+        for name in names:
+            self.index.setdefault(name, set()).add(recipe_id)
+        self.bits.append(self.canonicalizer.bits(names, canonical=True))
+
+    def lookup(self, ingredient):
+        """Recipe ids using an ingredient (falls back to its individual words)"""
+        key = self.canonicalizer.match(ingredient)
+        if key in self.index:
+            return self.index[key]
+        ids = set()
+        for word in key.split():
+            ids |= self.index.get(word, set())
+        return ids
+
+    def find(self, ingredients, limit=20):
+        """Recipes using the most of the given ingredients"""
+        names = self.canonicalizer.canonical_set(ingredients, match=True)
+        query = self.canonicalizer.bits(names, canonical=True)
+        candidates = set()
+        for name in names:
+            candidates |= self.lookup(name)
+
+        # Shared ingredients via bitset intersection; word-level fallback
+        # matches share no ids but still count once
+        count = self.canonicalizer.count
+        overlap = {i: count(self.bits[i] & query) or 1 for i in candidates}
+
+        # Most shared ingredients first, then the recipes needing the fewest extras
+        best = heapq.nsmallest(
+            limit, overlap,
+            key=lambda i: (-overlap[i], len(self.recipes[i]["ingredients"]), i)
+        )
+        return [self.recipes[i] for i in best]
+
+
+class Cancelled(Exception):
+    """Raised inside scheduled work once its job has been cancelled"""
+
+    @classmethod
+    def check(cls, event):
+        """Raise if event (a job's cancelled flag, or None) is set"""
+        if event is not None and event.is_set():
+            raise cls("request was cancelled")
+
+
+class ScheduledJob:
+    """A unit of background work and the callbacks waiting on it"""
+
+    def __init__(self, kind, key, fn, args, cancellable=False):
+        self.kind = kind
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.cancellable = cancellable  # fn takes the cancelled event as cancelled=
+        self.callbacks = []  # (on_done, on_error) pairs
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Drop the job (if queued) or its result (if running)"""
+        self.cancelled.set()
+
+
+class RequestScheduler:
+    """Bounded worker pool for LLM calls with per-kind limits, coalescing and cancellation"""
+
+    def __init__(self, max_workers=4, limits=None):
+        self.max_workers = max_workers
+        self.limits = limits or {}  # kind -> max concurrent jobs
+        self.pending = {}  # kind -> deque of jobs waiting for a slot
+        self.running = {}  # kind -> number of running jobs holding a slot
+        self.active = set()  # running jobs that still hold their slot
+        self.in_flight = {}  # (kind, key) -> job, for coalescing duplicates
+        self.latest = {}  # kind -> most recent job, for dropping stale requests
+        self.ready = queue.Queue()
+        self.ui_queue = queue.Queue()
+        self.lock = threading.Lock()
+
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"llm-worker-{i}")
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, kind, fn, *args, key=None, on_done=None, on_error=None, replace=True, cancellable=False):
+        """Queue fn(*args); callbacks run on the UI thread via drain()
+
+        With cancellable=True, fn also gets cancelled=<threading.Event> and
+        should stop early (e.g. raise Cancelled) once it is set.
+        """
+        with self.lock:
+            # An identical request is already running: wait on it instead
+            existing = self.in_flight.get((kind, key)) if key is not None else None
+            if existing and not existing.cancelled.is_set():
+                if (on_done, on_error) not in existing.callbacks:
+                    existing.callbacks.append((on_done, on_error))
+                return existing
+
+            # A newer request of the same kind makes the previous one stale
+            if replace and kind in self.latest:
+                self._drop(self.latest[kind])
+
+            job = ScheduledJob(kind, key, fn, args, cancellable)
+            job.callbacks.append((on_done, on_error))
+            self.latest[kind] = job
+            if key is not None:
+                self.in_flight[(kind, key)] = job
+            self.pending.setdefault(kind, deque()).append(job)
+            self._dispatch()
+        return job
+
+    def cancel(self, kind):
+        """Cancel every queued or running job of a kind, freeing their slots"""
+        with self.lock:
+            jobs = list(self.pending.get(kind, ())) + list(self.active) + list(self.in_flight.values())
+            if kind in self.latest:
+                jobs.append(self.latest[kind])
+            for job in jobs:
+                if job.kind == kind:
+                    self._drop(job)
+            self._dispatch()
+
+    def call_soon(self, fn, *args):
+        """Schedule fn(*args) on the UI thread (safe to call from workers)"""
+        self.ui_queue.put((fn, args))
+
+    def drain(self):
+        """Run queued UI callbacks; call periodically from the Tk loop"""
+        while True:
+            try:
+                fn, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args)
+
+    def _dispatch(self):
+        """Move pending jobs to the workers while their kind has free slots (lock held)"""
+        for kind, pending in self.pending.items():
+            limit = self.limits.get(kind, self.max_workers)
+            while pending and self.running.get(kind, 0) < limit:
+                job = pending.popleft()
+                if job.cancelled.is_set():
+                    self._forget(job)
+                    continue
+                self.running[kind] = self.running.get(kind, 0) + 1
+                self.active.add(job)
+                self.ready.put(job)
+
+    def _drop(self, job):
+        """Cancel a job; a running one gives its slot back at once (lock held)
+
+        The stale work may still be finishing on its worker thread, but the
+        next job of its kind no longer waits for it.
+        """
+        job.cancel()
+        self._release(job)
+        self._forget(job)
+
+    def _release(self, job):
+        """Free a running job's per-kind slot, once (lock held)"""
+        if job in self.active:
+            self.active.discard(job)
+            self.running[job.kind] -= 1
+
+    def _forget(self, job):
+        """Remove a finished or dropped job from the bookkeeping (lock held)"""
+        if self.in_flight.get((job.kind, job.key)) is job:
+            del self.in_flight[(job.kind, job.key)]
+        if self.latest.get(job.kind) is job:
+            del self.latest[job.kind]
+
+    def _worker(self):
+        """Worker thread loop"""
+        while True:
+            job = self.ready.get()
+            result, error = None, None
+            if not job.cancelled.is_set():
+                try:
+                    if job.cancellable:
+                        result = job.fn(*job.args, cancelled=job.cancelled)
+                    else:
+                        result = job.fn(*job.args)
+                except Exception as e:
+                    error = e
+
+            with self.lock:
+                self._release(job)
+                self._forget(job)
+                callbacks = list(job.callbacks)
+                self._dispatch()
+
+            if job.cancelled.is_set():
+                continue
+            for on_done, on_error in callbacks:
+                if error is not None:
+                    if on_error:
+                        self.call_soon(on_error, error)
+                elif on_done:
+                    self.call_soon(on_done, result)
+
+    def shutdown(self):
+        """Cancel all outstanding work"""
+        with self.lock:
+            for pending in self.pending.values():
+                for job in pending:
+                    job.cancel()
+            for job in list(self.active) + list(self.in_flight.values()):
+                job.cancel()
+
+
+class DishParser:
+    """Incremental parser for LLM dish output (line format, JSON lines or a JSON object)
+
+    feed() accepts arbitrary stream chunks and returns the dishes completed
+    by them; rejected lines are kept with a reason in self.rejected.
+    """
+
+    NUTRIENTS = ("calories", "protein", "carbs", "fats")
+    NUMBER = re.compile(r"\d+(?:\.\d+)?")
+    NUMBER_THOUSANDS = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?")
+    LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+    def __init__(self, mode="lines"):
+        self.mode = mode  # "lines" (also accepts JSON lines) or "json"
+        self.buffer = ""
+        self.rejected = []  # (text, reason)
+        self.parsed = 0
+
+        # JSON scanner state: position, string/escape flags, open-brace stack
+        self.pos = 0
+        self.in_string = False
+        self.escaped = False
+        self.starts = []
+        self.nested = []  # whether each open object contains another object
+
+    def feed(self, chunk):
+        """Parse a chunk; returns the dishes it completed"""
+        self.buffer += chunk
+        if self.mode == "json":
+            return self._scan_json()
+
+        dishes = []
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            dish = self.parse_line(line)
+            if dish:
+                dishes.append(dish)
+        return dishes
+
+    def close(self):
+        """Parse whatever is left at the end of the stream"""
+        if self.mode == "json":
+            dishes = self._scan_json()
+            if self.starts:
+                self._reject(self.buffer[self.starts[0]:], "unterminated JSON object")
+            return dishes
+        line, self.buffer = self.buffer, ""
+        dish = self.parse_line(line)
+        return [dish] if dish else []
+
+    def parse_line(self, line):
+        """One 'Name: cal, p, c, f' (or JSON object) line -> dish or None"""
+        text = self.LIST_MARKER.sub("", line.replace("**", "")).strip()
+        if not text:
+            return None
+        if text.startswith("{"):
+            try:
+                return self.parse_object(json.loads(text.rstrip(",")), text)
+            except ValueError:
+                return self._reject(text, "invalid JSON")
+        if ":" not in text:
+            return self._reject(text, "no ':' between name and nutrients")
+
+        name, nutrients = text.split(":", 1)
+        name = name.strip(" \t-–|")
+        if not name:
+            return self._reject(text, "empty dish name")
+
+        # Units and labels are ignored ("400 kcal", "30g protein"); "1,200"
+        # is only read as a thousands separator when that yields 4 values
+        values = self.NUMBER.findall(nutrients)
+        if len(values) != 4:
+            values = [v.replace(",", "") for v in self.NUMBER_THOUSANDS.findall(nutrients)]
+        if len(values) != 4:
+            return self._reject(text, f"expected 4 nutrient values, found {len(values)}")
+        return self._make_dish(name, [float(v) for v in values], text)
+
+    def parse_object(self, obj, text=""):
+        """A JSON dish object -> dish or None"""
+        if not isinstance(obj, dict):
+            return self._reject(text, "JSON value is not an object")
+        name = str(obj.get("name", "")).strip()
+        if not name:
+            return self._reject(text, "empty dish name")
+        values = []
+        for nutrient in self.NUTRIENTS:
+            value = obj.get(nutrient)
+            if isinstance(value, str):
+                match = self.NUMBER.search(value.replace(",", ""))
+                value = match.group() if match else None
+            try:
+                values.append(float(value))
+            except (TypeError, ValueError):
+                return self._reject(text, f"missing or non-numeric '{nutrient}'")
+        return self._make_dish(name, values, text)
+
+    def _make_dish(self, name, values, text):
+        if values[0] <= 0:
+            return self._reject(text, "calories must be positive")
+        self.parsed += 1
+        dish = {"name": name, "description": ""}
+        dish.update(zip(self.NUTRIENTS, values))
+        return dish
+
+    def _reject(self, text, reason):
+        self.rejected.append((text, reason))
+        return None
+
+    def _scan_json(self):
+        """Emit every innermost JSON object completed so far"""
+        dishes = []
+        buffer = self.buffer
+        while self.pos < len(buffer):
+            char = buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.nested:
+                    self.nested[-1] = True
+                self.starts.append(self.pos)
+                self.nested.append(False)
+            elif char == "}" and self.starts:
+                start = self.starts.pop()
+                has_children = self.nested.pop()
+                # Dish objects are leaves; wrappers like {"dishes": [...]} are skipped
+                if not has_children:
+                    text = buffer[start:self.pos + 1]
+                    try:
+                        dish = self.parse_object(json.loads(text), text)
+                    except ValueError:
+                        dish = self._reject(text, "invalid JSON")
+                    if dish:
+                        dishes.append(dish)
+            self.pos += 1
+
+        # Drop consumed text once no object is open
+        if not self.starts:
+            self.buffer = ""
+            self.pos = 0
+        return dishes
+
+
+class DishNameIndex:
+    """Canonical dish names: near-duplicates like "Grilled Chicken Salad" and
+    "Chicken Salad (Grilled)" resolve to the first name seen
+
+    Names reduce to a signature of sorted, singularized tokens without filler
+    words. Identical signatures merge directly; otherwise MinHash buckets over
+    character trigrams find candidates, which merge when their trigram Jaccard
+    similarity reaches the threshold and their calories (when known) agree.
+    Each name costs a constant number of hash lookups, so N names are O(N).
+    """
+
+    FILLER = {
+        "a", "an", "the", "and", "with", "of", "in", "on", "style", "easy", "quick",
+        "simple", "healthy", "classic", "homemade", "delicious", "recipe"
+    }
+    BANDS = 4
+    ROWS = 2
+    BUCKET_SIZE = 16  # most recent entries kept per bucket, bounding the work per name
+
+    def __init__(self, threshold=0.8, calorie_tolerance=0.2):
+        self.threshold = threshold
+        self.calorie_tolerance = calorie_tolerance
+        self.by_signature = {}  # signature -> canonical entry
+        self.buckets = {}  # (band, band hash) -> recent canonical entries
+        self.entries = []  # canonical entries: {"name", "signature", "trigrams", "calories"}
+        self.merged = 0
+
+        # Seeded CRC32s as the MinHash family: fixed, so bucket keys are the
+        # same in every process
+        self.seeds = range(1, self.BANDS * self.ROWS + 1)
+
+    @classmethod
+    def signature(cls, name):
+        """Order-insensitive normalized form of a dish name; usable as a cache key"""
+        words = re.sub(r"[\W_]+", " ", name.lower()).split()
+        tokens = {RecipeStore.normalize(word) for word in words if word not in cls.FILLER}
+        return " ".join(sorted(tokens))
+
+    @staticmethod
+    def trigrams(signature):
+        padded = f" {signature} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _minhash_bands(self, trigrams):
+        grams = [gram.encode("utf-8") for gram in trigrams]
+        values = [min(zlib.crc32(gram, seed) for gram in grams) for seed in self.seeds]
+        return [
+            (band, tuple(values[band * self.ROWS:(band + 1) * self.ROWS]))
+            for band in range(self.BANDS)
+        ]
+
+    def canonical(self, name, calories=None):
+        """Canonical name for name, registering it if it is new"""
+        return self._resolve(name, calories)[0]["name"]
+
+    def add(self, dish):
+        """Register a dish; False if it duplicates one already seen"""
+        entry, new = self._resolve(dish["name"], dish.get("calories"))
+        return new
+
+    def _resolve(self, name, calories=None):
+        """(canonical entry, whether it was just created)"""
+        signature = self.signature(name)
+        entry = self.by_signature.get(signature)
+        if entry is not None:
+            self.merged += 1
+            return entry, False
+
+        trigrams = self.trigrams(signature)
+        bands = self._minhash_bands(trigrams) if trigrams else []
+        checked = set()
+        for band in bands:
+            for candidate in self.buckets.get(band, ()):
+                if id(candidate) in checked:
+                    continue
+                checked.add(id(candidate))
+                if self._same_dish(candidate, trigrams, calories):
+                    # Later spellings resolve straight to the canonical entry
+                    self.by_signature[signature] = candidate
+                    self.merged += 1
+                    return candidate, False
+
+        entry = {"name": name, "signature": signature, "trigrams": trigrams, "calories": calories}
+        self.entries.append(entry)
+        self.by_signature[signature] = entry
+        for band in bands:
+            bucket = self.buckets.get(band)
+            if bucket is None:
+                bucket = self.buckets[band] = deque(maxlen=self.BUCKET_SIZE)
+            bucket.append(entry)
+        return entry, True
+
+    def _same_dish(self, entry, trigrams, calories):
+        """Merge rule: similar enough names and, when both are known, similar calories"""
+        union = len(entry["trigrams"] | trigrams)
+        if not union or len(entry["trigrams"] & trigrams) / union < self.threshold:
+            return False
+        if calories and entry["calories"]:
+            low, high = sorted((float(calories), float(entry["calories"])))
+            return high <= low * (1 + self.calorie_tolerance)
+        return True
+
+
+class DishIndex:
+    """Dish set with pre-sorted nutrient columns, updated incrementally as dishes are added"""
+
+    NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+    def __init__(self, dishes=()):
+        self.dishes = []
+        self.rows = []  # [calories, protein, carbs, fats] per dish, in dish order
+        self.columns = [[] for _ in self.NUTRIENTS]  # each kept sorted
+        self._matrix = None  # NumPy copy of rows, rebuilt lazily after changes
+        self.extend(dishes)
+
+    def __len__(self):
+        return len(self.dishes)
+
+    def add(self, dish):
+        """Add one dish, keeping every column sorted"""
+        row = [float(dish[n]) for n in self.NUTRIENTS]
+        self.dishes.append(dish)
+        self.rows.append(row)
+        for column, value in zip(self.columns, row):
+            bisect.insort(column, value)
+        self._matrix = None
+
+    def extend(self, dishes):
+        """Add many dishes at once"""
+        for dish in dishes:
+            row = [float(dish[n]) for n in self.NUTRIENTS]
+            self.dishes.append(dish)
+            self.rows.append(row)
+            for column, value in zip(self.columns, row):
+                column.append(value)
+        for column in self.columns:
+            column.sort()
+        self._matrix = None
+
+    def closest(self, nutrient_idx, goal):
+        """Value closest to goal in a column (same rule as binary_search), O(log N)"""
+        column = self.columns[nutrient_idx]
+        i = min(bisect.bisect_left(column, goal), len(column) - 1)
+        if i > 0 and abs(column[i - 1] - goal) < abs(column[i] - goal):
+            i -= 1
+        return column[i]
+
+    def scores(self, goals):
+        """Per-dish scores in dish order (same values as calculate_score)"""
+        if not self.dishes or not goals:
+            return []
+        ideal = [self.closest(j, goal) for j, goal in enumerate(goals)]
+
+        if np is not None:
+            if self._matrix is None:
+                self._matrix = np.array(self.rows, dtype=float)
+            goal_vec = np.asarray(goals, dtype=float)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                per_nutrient = 1 - np.abs(np.asarray(ideal) - self._matrix) / goal_vec
+            per_nutrient = np.where(goal_vec != 0, np.clip(per_nutrient, 0.0, 1.0), 1.0)
+            return per_nutrient.mean(axis=1).tolist()
+
+        scores = []
+        for row in self.rows:
+            total = 0.0
+            for value, ideal_value, goal in zip(row, ideal, goals):
+                score = 1 - (abs(ideal_value - value) / goal) if goal != 0 else 1.0
+                total += max(0.0, min(score, 1.0))
+            scores.append(total / len(goals))
+        return scores
+
+
+class DayPlanner:
+    """Picks k meals (optionally with portion multipliers) whose totals best match daily targets
+
+    Deviation is the sum over nutrients of |total - goal| / goal, plus an
+    optional per-dish penalty (negative for a bonus). Small pools are searched
+    exactly (branch and bound); large ones use greedy starts refined by
+    single-meal swaps.
+    """
+
+    NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+    def __init__(self, dishes, portions=(1.0,), penalties=None):
+        self.dishes = dishes
+        self.portions = tuple(portions)
+        # One candidate per (dish, portion), grouped by dish
+        self.candidates = [(i, p) for i in range(len(dishes)) for p in self.portions]
+        self.vectors = [
+            [float(dishes[i][n]) * p for n in self.NUTRIENTS] for i, p in self.candidates
+        ]
+        penalties = penalties or [0.0] * len(dishes)
+        self.penalties = [float(penalties[i]) for i, _ in self.candidates]
+        self.matrix = None
+        if np is not None:
+            self.matrix = np.asarray(self.vectors, dtype=float).reshape(-1, 4)
+            self.penalty_array = np.asarray(self.penalties, dtype=float)
+
+    @staticmethod
+    def deviation(totals, goals):
+        """Summed relative deviation of totals from goals"""
+        return sum(abs(t - g) / g for t, g in zip(totals, goals) if g)
+
+    def cost(self, chosen, goals):
+        """Deviation of the chosen candidates' totals plus their penalties"""
+        totals = [sum(self.vectors[c][j] for c in chosen) for j in range(4)]
+        return self.deviation(totals, goals) + sum(self.penalties[c] for c in chosen)
+
+    def solve(self, goals, meals=3, exact_limit=60, max_nodes=10_000):
+        """Best plan for daily goals [calories, protein, carbs, fats]; None if the pool is too small
+
+        The node cap keeps the exact search to a few tens of milliseconds;
+        if it is hit the best plan found so far is returned with exact=False.
+        """
+        if meals <= 0 or len(self.dishes) < meals:
+            return None
+
+        # Without NumPy each swap scan is a Python loop, so fewer restarts
+        best = self._local_search(goals, meals, restarts=8 if self.matrix is not None else 2)
+        exact = False
+        if len(self.candidates) <= exact_limit:
+            best, exact = self._branch_and_bound(goals, meals, best, max_nodes)
+        return self._plan(best, goals, exact)
+
+    def _plan(self, chosen, goals, exact):
+        totals = [sum(self.vectors[c][j] for c in chosen) for j in range(4)]
+        per_nutrient = [max(0.0, 1 - abs(t - g) / g) if g else 1.0 for t, g in zip(totals, goals)]
+        return {
+            "meals": [
+                {"dish": self.dishes[self.candidates[c][0]], "portion": self.candidates[c][1]}
+                for c in chosen
+            ],
+            "totals": dict(zip(self.NUTRIENTS, totals)),
+            "deviation": self.deviation(totals, goals),
+            "penalty": sum(self.penalties[c] for c in chosen),
+            "score": sum(per_nutrient) / len(per_nutrient),
+            "exact": exact
+        }
+
+    def _best_candidate(self, base, goals, used):
+        """Candidate minimising deviation(base + candidate) + its penalty, skipping used dishes"""
+        if self.matrix is not None:
+            goal_vec = np.asarray(goals, dtype=float)
+            safe = np.where(goal_vec != 0, goal_vec, 1.0)
+            cost = (np.abs(np.asarray(base) + self.matrix - goal_vec) / safe)[:, goal_vec != 0].sum(axis=1)
+            cost += self.penalty_array
+            if used:
+                for dish in used:
+                    start = dish * len(self.portions)
+                    cost[start:start + len(self.portions)] = np.inf
+            c = int(np.argmin(cost))
+            return c, float(cost[c])
+
+        best, best_cost = None, float("inf")
+        for c, vector in enumerate(self.vectors):
+            if self.candidates[c][0] in used:
+                continue
+            cost = self.deviation([b + v for b, v in zip(base, vector)], goals) + self.penalties[c]
+            if cost < best_cost:
+                best, best_cost = c, cost
+        return best, best_cost
+
+    def _local_search(self, goals, meals, restarts=8):
+        """Greedy construction from several first meals, then single-meal swaps to a local optimum"""
+        share = [g / meals for g in goals]
+        # Seeds: the candidates that best fit one meal's share of the day
+        seeds = []
+        used = set()
+        for _ in range(min(restarts, len(self.dishes))):
+            c, _ = self._best_candidate([0.0] * 4, share, used)
+            seeds.append(c)
+            used.add(self.candidates[c][0])
+
+        best, best_cost = None, float("inf")
+        for seed in seeds:
+            chosen = [seed]
+            totals = list(self.vectors[seed])
+            for slot in range(1, meals):
+                target = [g * (slot + 1) / meals for g in goals]
+                c, _ = self._best_candidate(totals, target, {self.candidates[x][0] for x in chosen})
+                chosen.append(c)
+                totals = [t + v for t, v in zip(totals, self.vectors[c])]
+
+            cost = self.cost(chosen, goals)
+            improved = True
+            while improved:
+                improved = False
+                for slot in range(meals):
+                    base = [t - v for t, v in zip(totals, self.vectors[chosen[slot]])]
+                    others = [x for i, x in enumerate(chosen) if i != slot]
+                    c, new_cost = self._best_candidate(base, goals, {self.candidates[x][0] for x in others})
+                    new_cost += sum(self.penalties[x] for x in others)
+                    if new_cost < cost - 1e-12:
+                        chosen[slot] = c
+                        totals = [b + v for b, v in zip(base, self.vectors[c])]
+                        cost = new_cost
+                        improved = True
+
+            if cost < best_cost:
+                best, best_cost = sorted(chosen), cost
+        return best
+
+    def _branch_and_bound(self, goals, meals, incumbent, max_nodes):
+        """Exact search over dish combinations, pruned with per-nutrient range bounds"""
+        per_dish = len(self.portions)
+
+        # Visiting dishes in calorie order makes the suffix ranges below
+        # shrink quickly, so the calorie bound prunes most branches
+        order = sorted(range(len(self.dishes)), key=lambda i: float(self.dishes[i]["calories"]))
+        groups = [
+            [(c, self.vectors[c], self.penalties[c]) for c in range(i * per_dish, (i + 1) * per_dish)]
+            for i in order
+        ]
+        n_dishes = len(groups)
+
+        # Suffix min/max of each nutrient (and min penalty) over groups d..
+        # so the remaining r meals can add between r * low and r * high
+        low = [[float("inf")] * 4 for _ in range(n_dishes + 1)]
+        high = [[float("-inf")] * 4 for _ in range(n_dishes + 1)]
+        low_penalty = [float("inf")] * (n_dishes + 1)
+        for d in range(n_dishes - 1, -1, -1):
+            for j in range(4):
+                values = [vector[j] for _, vector, _ in groups[d]]
+                low[d][j] = min(low[d + 1][j], min(values))
+                high[d][j] = max(high[d + 1][j], max(values))
+            low_penalty[d] = min(low_penalty[d + 1], min(p for _, _, p in groups[d]))
+
+        active = [(j, goals[j]) for j in range(4) if goals[j]]
+        best = list(incumbent)
+        best_cost = [self.cost(best, goals)]
+        nodes = [0]
+        chosen = []
+
+        def bound(totals, d, remaining):
+            total = remaining * low_penalty[d]
+            for j, goal in active:
+                need = goal - totals[j]
+                if need < remaining * low[d][j]:
+                    total += (remaining * low[d][j] - need) / goal
+                elif need > remaining * high[d][j]:
+                    total += (need - remaining * high[d][j]) / goal
+            return total
+
+        def search(start, totals, penalty):
+            remaining = meals - len(chosen)
+            for d in range(start, n_dishes - remaining + 1):
+                # Suffix ranges only shrink with d, so the bound only grows
+                if penalty + bound(totals, d, remaining) >= best_cost[0]:
+                    break
+                nodes[0] += per_dish
+                if nodes[0] > max_nodes:
+                    return False
+                for c, vector, extra in groups[d]:
+                    new_totals = [t + v for t, v in zip(totals, vector)]
+                    if remaining == 1:
+                        cost = penalty + extra
+                        for j, goal in active:
+                            cost += abs(new_totals[j] - goal) / goal
+                        if cost < best_cost[0] - 1e-12:
+                            best_cost[0] = cost
+                            best[:] = chosen + [c]
+                        continue
+                    chosen.append(c)
+                    finished = search(d + 1, new_totals, penalty + extra)
+                    chosen.pop()
+                    if not finished:
+                        return False
+            return True
+
+        complete = search(0, [0.0] * 4, 0.0)
+        return sorted(best), complete
+
+
+class WeekPlanner:
+    """A week of day plans with no-repeat and variety windows and leftover reuse
+
+    Each day is solved by DayPlanner against the daily goals while the other
+    days stay fixed, so swapping a meal re-solves only that day.
+    """
+
+    def __init__(self, dishes, nutrition_goals, ingredients=(), days=7, meals=3, portions=(1.0,),
+                 no_repeat_days=1, variety_days=3, variety_penalty=0.1,
+                 leftover_bonus=0.02, pantry_bonus=0.01, canonicalizer=None):
+        self.dishes = dishes
+        self.goals = [float(nutrition_goals[n]) for n in DayPlanner.NUTRIENTS]
+        self.meals = meals
+        self.portions = portions
+        self.no_repeat_days = no_repeat_days  # a dish never recurs this many days apart or closer
+        self.variety_days = variety_days  # repeats inside this window are penalized
+        self.variety_penalty = variety_penalty
+        self.leftover_bonus = leftover_bonus  # per ingredient shared with the previous day
+        self.pantry_bonus = pantry_bonus  # per ingredient from the user's list
+
+        self.canonicalizer = canonicalizer or IngredientCanonicalizer()
+        self.pantry_names = self.canonicalizer.canonical_set(ingredients, match=True)
+        self.pantry = self.canonicalizer.bits(self.pantry_names, canonical=True)
+        self.dish_ingredients = [self._ingredients(dish) for dish in dishes]  # bitsets
+
+        self.assignments = [[] for _ in range(days)]  # dish indices per day
+        self.days = [None] * days  # DayPlanner plans
+        self.banned = [set() for _ in range(days)]  # dishes swapped out of each day
+
+    def _ingredients(self, dish):
+        """Ingredient bitset of a dish (pantry items named in the dish name if it has no list)"""
+        if dish.get("ingredients"):
+            return self.canonicalizer.bits(dish["ingredients"])
+        words = set(RecipeStore.normalize(dish["name"].lower()).split())
+        return self.canonicalizer.bits(
+            [item for item in self.pantry_names if set(item.split()) <= words], canonical=True
+        )
+
+    def plan_week(self):
+        """Solve every day in order; returns the day plans"""
+        for day in range(len(self.days)):
+            self.solve_day(day)
+        return self.days
+
+    def swap(self, day, meal):
+        """Replace one meal: its dish is banned from that day and only that day is re-solved"""
+        self.banned[day].add(self.assignments[day][meal])
+        return self.solve_day(day)
+
+    def solve_day(self, day):
+        """Re-solve one day with every other day held fixed"""
+        blocked = set(self.banned[day])
+        repeats = {}
+        for other, assigned in enumerate(self.assignments):
+            distance = abs(other - day)
+            if other == day or not assigned:
+                continue
+            for i in assigned:
+                if distance <= self.no_repeat_days:
+                    blocked.add(i)
+                elif distance <= self.variety_days:
+                    repeats[i] = repeats.get(i, 0) + 1
+
+        leftovers = 0
+        if day > 0:
+            for i in self.assignments[day - 1]:
+                leftovers |= self.dish_ingredients[i]
+
+        pool = [i for i in range(len(self.dishes)) if i not in blocked]
+        if len(pool) < self.meals:
+            # Too few dishes for the hard window: fall back to penalizing repeats
+            pool = [i for i in range(len(self.dishes)) if i not in self.banned[day]]
+            if len(pool) < self.meals:
+                pool = list(range(len(self.dishes)))
+            for i in blocked:
+                repeats[i] = repeats.get(i, 0) + 2
+
+        penalties = []
+        for i in pool:
+            uses = self.dish_ingredients[i]
+            count = self.canonicalizer.count
+            penalty = self.variety_penalty * repeats.get(i, 0)
+            penalty -= self.leftover_bonus * min(3, count(uses & leftovers))
+            penalty -= self.pantry_bonus * min(3, count(uses & self.pantry))
+            penalties.append(penalty)
+
+        plan = DayPlanner([self.dishes[i] for i in pool], self.portions, penalties).solve(self.goals, self.meals)
+        if plan is None:
+            return None
+
+        # Map the chosen dishes back to indices in the full pool
+        position = {id(self.dishes[i]): i for i in pool}
+        self.assignments[day] = [position[id(meal["dish"])] for meal in plan["meals"]]
+        plan["day"] = day
+        self.days[day] = plan
+        return plan
+
+
+class ChatSession:
+    """Bounded multi-turn chat memory: recent turns verbatim, older ones in a rolling summary"""
+
+    def __init__(self, planner=None, window=8, summarize=True, scheduler=None):
+        self.planner = planner
+        self.window = window  # recent messages sent verbatim
+        self.summarize = summarize and planner is not None
+        self.scheduler = scheduler  # runs summaries as "summary" jobs; inline without one
+        self.turns = deque()
+        self.summary = ""
+        self.pending = []  # messages that left the window but are not summarized yet
+        self.lock = threading.Lock()
+        self.summarizing = False
+        self.generation = 0  # bumped by clear() so stale summaries are dropped
+
+    def add(self, role, content):
+        """Append a message; overflow is folded into the summary on the scheduler"""
+        with self.lock:
+            self.turns.append({"role": role, "content": content})
+            while len(self.turns) > self.window:
+                turn = self.turns.popleft()
+                if self.summarize:
+                    self.pending.append(turn)
+            # Summaries share the rate limit with chat, so fold turns in batches
+            start = len(self.pending) >= max(2, self.window // 2) and not self.summarizing
+            if start:
+                self.summarizing = True
+        if start:
+            if self.scheduler is not None:
+                # replace=False: a newer batch must not cancel the running summary
+                self.scheduler.submit("summary", self._summarize_pending, replace=False)
+            else:
+                self._summarize_pending()
+
+    def clear(self):
+        """Forget everything"""
+        with self.lock:
+            self.turns.clear()
+            self.pending = []
+            self.summary = ""
+            self.generation += 1
+
+    def messages(self, max_tokens):
+        """(summary, recent messages) fitting in max_tokens, newest turns kept first"""
+        with self.lock:
+            summary = PromptBudget.truncate(self.summary, max_tokens // 3)
+            turns = list(self.turns)
+
+        remaining = max_tokens - PromptBudget.estimate(summary)
+        recent = []
+        for turn in reversed(turns):
+            cost = PromptBudget.estimate(turn["content"]) + 4
+            if cost > remaining:
+                break
+            recent.append(turn)
+            remaining -= cost
+        recent.reverse()
+
+        # The history must open with a user turn
+        while recent and recent[0]["role"] != "user":
+            recent.pop(0)
+        return summary, recent
+
+    def _summarize_pending(self):
+        """Fold pending messages into the summary until none are left"""
+        while True:
+            with self.lock:
+                if len(self.pending) < max(2, self.window // 2):
+                    self.summarizing = False
+                    return
+                batch, self.pending = self.pending, []
+                summary, generation = self.summary, self.generation
+            try:
+                summary = self.planner.summarize_chat(summary, batch)
+            except Exception:
+                self.planner.count("chat_summary_errors")
+                with self.lock:
+                    # Keep the turns for the next attempt
+                    if generation == self.generation:
+                        self.pending = batch + self.pending
+                    self.summarizing = False
+                return
+            with self.lock:
+                if generation == self.generation:
+                    self.summary = summary
+
+
+class NutritionPlanner:
+    """GUI-free DNA Buddy engine: profile -> goals, ingredients -> dishes, scoring and chat"""
+
+    def __init__(self, api_key, base_url="https://api.groq.com/openai/v1",
+                 cache_path=None, recipes_path=RECIPES_PATH,
+                 pool_size=4, connect_timeout=5, read_timeout=60):
+        # Shared LLM transport (pooled keep-alive connections)
+        self.llm = LLMClient(
+            api_key, base_url=base_url, pool_size=pool_size,
+            connect_timeout=connect_timeout, read_timeout=read_timeout
+        )
+
+        # Cache for deterministic prompts (profile analysis, dish generation)
+        self.response_cache = ResponseCache(max_entries=256, ttl=24 * 3600, path=cache_path)
+
+        # Retry/backoff policy and client-side rate limit (Groq free tier is 30 req/min)
+        self.retry_policy = RetryPolicy(retries=3, base_delay=1.0, max_delay=30.0)
+        self.rate_limiter = TokenBucket(rate=0.5, capacity=5)
+
+        # Local recipe database; the LLM is only asked when it has too few matches
+        self.canonicalizer = IngredientCanonicalizer()
+        self.recipe_store = RecipeStore(recipes_path, self.canonicalizer)
+        self.min_local_dishes = 8
+
+        # LLM dish generation is split into parallel shards of smaller requests
+        self.dish_shards = DISH_SHARDS
+        self.dishes_per_request = 20
+
+        # Dish output format: "lines" (Name: cal, p, c, f), "jsonl" (one JSON
+        # object per line) or "json" (API JSON mode; arrives in one piece)
+        self.dish_format = "lines"
+
+        # Counters for parse yield and fallbacks
+        self.counters = {}
+        self.counters_lock = threading.Lock()
+
+        # Per-request token budgets (input is estimated offline; output is
+        # sent as max_tokens and also covers the model's reasoning tokens)
+        self.budgets = {
+            "profile": PromptBudget("profile", max_input_tokens=300, max_output_tokens=1024),
+            "dishes": PromptBudget("dishes", max_input_tokens=300, max_output_tokens=2048),
+            "chat": PromptBudget("chat", max_input_tokens=1500, max_output_tokens=1024),
+            "summary": PromptBudget("summary", max_input_tokens=1200, max_output_tokens=512)
+        }
+        self.prompt_log = deque(maxlen=200)  # (budget name, estimated prompt tokens, max_tokens)
+        self.prompt_stats = {}  # budget name -> {"calls", "tokens", "max"}
+
+    def count(self, name, amount=1):
+        """Increment a named counter"""
+        with self.counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_prompt(self, name, tokens, max_tokens):
+        """Log the estimated size of an outgoing prompt"""
+        with self.counters_lock:
+            self.prompt_log.append((name, tokens, max_tokens))
+            stats = self.prompt_stats.setdefault(name, {"calls": 0, "tokens": 0, "max": 0})
+            stats["calls"] += 1
+            stats["tokens"] += tokens
+            stats["max"] = max(stats["max"], tokens)
+
+    def close(self):
+        """Release pooled connections and the cache database"""
+        self.llm.close()
+        self.response_cache.close()
+
+    def analyze_profile(self, dna_text, goal):
+        """Profile text + fitness goal -> daily nutrition goals"""
+        budget = self.budgets["profile"]
+        # The profile text is trimmed to whatever the instructions leave over
+        prompt = budget.fill([
+            (1, f"DNA profile: {dna_text}", True),
+            (0, f"""
+Goal: {goal}
+
+Create a nutrition plan with daily targets. Return ONLY JSON:
+{{"calories": <number>, "protein": <number>, "carbs": <number>, "fats": <number>, "exercise_plan": "<brief plan>"}}""", True)
+        ])
+
+        # Invalid responses raise ValueError inside hackclub_ai, so they are
+        # retried and never cached
+        result = {}
+        parse_errors = []
+
+        def validate(response):
+            try:
+                result.update(self.parse_profile(response))
+            except ValueError as e:
+                parse_errors.append(e)
+                self.count("profile_parse_errors")
+                raise
+
+        response_format = PROFILE_SCHEMA
+        while True:
+            try:
+                self.hackclub_ai(prompt, use_cache=True, response_format=response_format,
+                                 validate=validate, budget=budget)
+                self.count("profile_parsed")
+                return result
+            except Exception as e:
+                if response_format is PROFILE_SCHEMA and self._rejected_request(e):
+                    # Endpoint without structured outputs: fall back to plain JSON mode
+                    self.count("profile_schema_unsupported")
+                    response_format = {"type": "json_object"}
+                    continue
+                # Defaults only stand in for unusable replies; auth, network
+                # and other upstream failures still reach the caller
+                if e.__cause__ is None or e.__cause__ not in parse_errors:
+                    raise
+                self.count("profile_fallback")
+                return dict(DEFAULT_GOALS)
+
+    def parse_profile(self, response):
+        """Validate an analysis response against PROFILE_SCHEMA -> nutrition goals (ValueError if unusable)"""
+        recommendations = extract_json_object(response, required=("calories",))
+
+        goals = {}
+        for field, (low, high) in PROFILE_LIMITS.items():
+            value = recommendations.get(field)
+            if isinstance(value, str):
+                # Tolerate units in plain JSON mode ("2200 kcal", "150g")
+                match = DishParser.NUMBER.search(value.replace(",", ""))
+                value = match.group() if match else None
+            if isinstance(value, bool) or value is None:
+                raise ValueError(f"'{field}' is missing or not a number")
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{field}' is missing or not a number")
+            if not low <= value <= high:
+                raise ValueError(f"'{field}' = {value} is outside the plausible range")
+            goals[field] = value
+
+        plan = recommendations.get("exercise_plan")
+        goals["exercise_plan"] = plan.strip() if isinstance(plan, str) and plan.strip() else DEFAULT_GOALS["exercise_plan"]
+        return goals
+
+    @staticmethod
+    def _rejected_request(error):
+        """True if the API refused the request itself (e.g. an unsupported response_format)"""
+        cause = error.__cause__
+        response = getattr(cause, "response", None)
+        return response is not None and response.status_code in (400, 422)
+
+    def meal_goals(self, nutrition_goals):
+        """Per-meal [calories, protein, carbs, fats] targets (a third of the daily goals)"""
+        return [
+            nutrition_goals['calories'] / 3,
+            nutrition_goals['protein'] / 3,
+            nutrition_goals['carbs'] / 3,
+            nutrition_goals['fats'] / 3
+        ]
+
+    def generate_dishes(self, ingredients, nutrition_goals, top_k=12, on_partial=None, cancelled=None):
+        """Ingredients -> (scored dish pool, top_k ranked dishes); on_partial gets interim rankings
+
+        Setting the cancelled event stops the LLM shards between stream
+        chunks and raises Cancelled.
+        """
+        goals = self.meal_goals(nutrition_goals)
+
+        # The LLM sees the user's own wording (trimmed, de-duplicated); the
+        # canonical forms only drive recipe matching and the prompt order,
+        # so reordered lists still share LLM cache entries
+        originals = {}
+        for ingredient in ingredients:
+            text = " ".join(ingredient.split())
+            if text:
+                originals.setdefault(text.lower(), text)
+        canonical = self.canonicalizer.canonical
+        ingredients = sorted(originals.values(), key=lambda text: (canonical(text), text.lower()))
+        if not ingredients:
+            raise ValueError("No ingredients given.")
+
+        dishes = []
+        for recipe in self.recipe_store.find(ingredients, limit=20):
+            dishes.append({
+                "name": recipe["name"],
+                "description": "",
+                "ingredients": list(recipe["ingredients"]),
+                "calories": float(recipe["calories"]),
+                "protein": float(recipe["protein"]),
+                "carbs": float(recipe["carbs"]),
+                "fats": float(recipe["fats"])
+            })
+
+        # Local recipes can be near-duplicates of each other too
+        names = DishNameIndex()
+        dishes = [dish for dish in dishes if names.add(dish)]
+
+        # Sorted nutrient columns are kept up to date as dishes arrive, so
+        # each re-rank only costs a few bisects plus the final scoring pass.
+        # The index lives for one generation: every interim ranking and the
+        # final one come from it, and callers never re-rank a pool later
+        index = DishIndex(dishes)
+
+        if len(dishes) < self.min_local_dishes:
+            # Score and show each LLM dish as soon as its line has streamed in
+            lock = threading.Lock()
+
+            def on_dish(dish):
+                with lock:
+                    index.add(dish)
+                    _, top = self.rank_dishes(index.dishes, goals, top_k, index)
+                if on_partial:
+                    on_partial(top)
+
+            if dishes and on_partial:
+                on_partial(self.rank_dishes(index.dishes, goals, top_k, index)[1])
+            self._generate_ai_dishes(ingredients, dishes, on_dish=on_dish, cancelled=cancelled)
+
+        if not index.dishes:
+            raise Exception("No valid dishes returned from AI.")
+
+        return self.rank_dishes(index.dishes, goals, top_k, index)
+
+    def plan_day(self, dishes, nutrition_goals, meals=3, portions=(1.0,)):
+        """Choose `meals` dishes (optionally scaled by portions) whose totals best hit the daily goals"""
+        goals = [float(nutrition_goals[n]) for n in DayPlanner.NUTRIENTS]
+        return DayPlanner(dishes, portions).solve(goals, meals)
+
+    def plan_week(self, dishes, nutrition_goals, ingredients=(), days=7, meals=3, portions=(1.0,)):
+        """WeekPlanner over the dish pool with every day solved; swap meals on it later"""
+        week = WeekPlanner(dishes, nutrition_goals, ingredients, days=days, meals=meals, portions=portions,
+                           canonicalizer=self.canonicalizer)
+        week.plan_week()
+        return week
+
+    def rank_dishes(self, dishes, goals, top_k=12, index=None):
+        """Score dishes against per-meal goals; returns (dishes, top dishes)"""
+        if index is None:
+            index = DishIndex(dishes)
+        scores = index.scores(goals)
+
+        for idx, score in enumerate(scores):
+            dishes[idx]['score'] = round(score, 3)
+            dishes[idx]['dish_id'] = idx
+
+        # Only the displayed dishes need to be ranked
+        top = self.top_k(scores, top_k)
+        return dishes, [dishes[idx] for idx, _ in top]
+
+    def _generate_ai_dishes(self, ingredients, existing, on_dish=None, cancelled=None):
+        """Ask the LLM for dishes (fallback when the local recipe index has too few)"""
+        # Only as many ingredients as fit the prompt budget are sent
+        budget = self.budgets["dishes"]
+        room = budget.max_input_tokens - budget.estimate(self._dish_prompt([], self.dishes_per_request))
+        ingredients = budget.take(ingredients, room // 2) or ingredients[:1]
+
+        shards = max(1, min(self.dish_shards, len(ingredients), self.dishes_per_request))
+        per_shard = -(-self.dishes_per_request // shards)
+
+        # Each shard emphasizes a different slice of the ingredients so the
+        # parallel requests don't all come back with the same dishes
+        prompts = []
+        for shard in range(shards):
+            emphasis = ingredients[shard::shards] if shards > 1 else []
+            prompts.append(self._dish_prompt(ingredients, per_shard, emphasis))
+
+        names = DishNameIndex()
+        for dish in existing:
+            names.add(dish)
+        dishes = []
+        lock = threading.Lock()
+
+        def add_dishes(parsed):
+            # Merge dishes as soon as they arrive, dropping near-duplicates
+            for dish in parsed:
+                with lock:
+                    if not DishNameIndex.signature(dish['name']) or not names.add(dish):
+                        continue
+                    dishes.append(dish)
+                if on_dish:
+                    on_dish(dish)
+
+        json_mode = self.dish_format == "json"
+
+        def run_shard(prompt):
+            # Stream the completion and parse each dish once it is complete
+            parser = DishParser("json" if json_mode else "lines")
+            streamed = [False]
+
+            def on_delta(delta):
+                streamed[0] = True
+                add_dishes(parser.feed(delta))
+
+            Cancelled.check(cancelled)
+            response = self.hackclub_ai(
+                prompt, use_cache=True,
+                on_delta=None if json_mode else on_delta,
+                response_format={"type": "json_object"} if json_mode else None,
+                budget=budget, cancelled=cancelled
+            )
+            # Cached (and JSON mode) responses arrive whole, without any deltas
+            if not streamed[0]:
+                add_dishes(parser.feed(response))
+            add_dishes(parser.close())
+
+            self.count("dish_lines_parsed", parser.parsed)
+            self.count("dish_lines_rejected", len(parser.rejected))
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            futures = [pool.submit(run_shard, prompt) for prompt in prompts]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+
+        # A cancelled job's partial dishes are of no use to anyone
+        Cancelled.check(cancelled)
+        if errors and len(errors) == len(prompts):
+            raise errors[0]
+        return dishes
+
+    def _dish_prompt(self, ingredients, count, emphasis=None):
+        """Prompt asking for dishes in the configured output format"""
+        focus = ""
+        if emphasis:
+            focus = f"\nFeature these ingredients prominently: {', '.join(emphasis)}."
+        if self.dish_format == "json":
+            return f"""Generate {count} meal dishes using these ingredients: {', '.join(ingredients)}.{focus}
+Return ONLY a JSON object of this shape (numbers in kcal and grams):
+{{"dishes": [{{"name": "Grilled Chicken Salad", "calories": 400, "protein": 30, "carbs": 20, "fats": 15}}]}}
+"""
+        if self.dish_format == "jsonl":
+            return f"""Generate {count} meal dishes using these ingredients: {', '.join(ingredients)}.{focus}
+Return one JSON object per line and nothing else (numbers in kcal and grams):
+{{"name": "Grilled Chicken Salad", "calories": 400, "protein": 30, "carbs": 20, "fats": 15}}
+{{"name": "Quinoa Veggie Bowl", "calories": 350, "protein": 15, "carbs": 50, "fats": 10}}
+"""
+        return f"""Generate {count} meal dishes using these ingredients: {', '.join(ingredients)}.{focus}
+Strictly follow this format for each dish (one per line):
+
+DishNameWithoutColonsOrCommas: Calories, Protein (g), Carbs (g), Fats (g)
+
+Example:
+Grilled Chicken Salad: 400, 30, 20, 15
+Quinoa Veggie Bowl: 350, 15, 50, 10
+"""
+
+    def chat(self, message, nutrition_goals=None, dishes=None,
+             personality="friendly and supportive", on_delta=None, session=None):
+        """Answer a chat message in the given personality (streams to on_delta when given)
+
+        With a ChatSession, recent turns are sent as messages along with the
+        rolling summary of older ones, and the exchange is added to it.
+        """
+        budget = self.budgets["chat"]
+        question = budget.truncate(message, budget.max_input_tokens // 4)
+
+        # Build context with personality and nutrition goals
+        context = f"You are a {personality} nutrition AI assistant named DNA Buddy. "
+
+        goals_context = ""
+        if nutrition_goals:
+            goals_context += f"\n\nUser's nutrition goals:\n"
+            goals_context += f"- Daily calories: {int(nutrition_goals['calories'])} kcal\n"
+            goals_context += f"- Protein: {int(nutrition_goals['protein'])}g\n"
+            goals_context += f"- Carbs: {int(nutrition_goals['carbs'])}g\n"
+            goals_context += f"- Fats: {int(nutrition_goals['fats'])}g\n"
+
+        dishes_context = ""
+        if dishes:
+            names = budget.take([d['name'] for d in dishes[:10]], budget.max_input_tokens // 4)
+            if names:
+                dishes_context = f"\n\nRecommended dishes: {', '.join(names)}\n"
+
+        # Personality prefix
+        personality_prefixes = {
+            "pirate chef": "Respond like a pirate chef. Use pirate language and cooking terms. ",
+            "zen wellness guru": "Respond like a zen wellness guru. Be calm, peaceful, and mindful. ",
+            "scientific researcher": "Respond like a scientific researcher. Use technical terms and cite studies. ",
+            "enthusiastic fitness coach": "Respond like an enthusiastic fitness coach. Be energetic and motivating! ",
+            "wise health mentor": "Respond like a wise health mentor. Be thoughtful and share wisdom. ",
+            "casual buddy": "Respond like a casual friend. Be relaxed and conversational. ",
+        }
+
+        personality_prefix = personality_prefixes.get(personality, "")
+
+        # Persona first, then goals, then dishes; history gets what is left
+        system = budget.fill([
+            (0, personality_prefix, False),
+            (0, context, False),
+            (1, goals_context, False),
+            (2, dishes_context, False)
+        ], max_tokens=budget.max_input_tokens // 3)
+
+        history = []
+        if session:
+            room = budget.max_input_tokens - budget.estimate(system) - budget.estimate(question)
+            summary, history = session.messages(room)
+            if summary:
+                system += f"\n\nSummary of the earlier conversation:\n{summary}\n"
+
+        reply = self.hackclub_ai(question, on_delta=on_delta, budget=budget,
+                                 system=system, history=history)
+        if session:
+            session.add("user", message)
+            session.add("assistant", reply)
+        return reply
+
+    def summarize_chat(self, summary, turns):
+        """Fold chat turns into a running summary (used by ChatSession in the background)"""
+        budget = self.budgets["summary"]
+        instructions = ("Update the running summary of a nutrition chat with the new messages. "
+                        "Keep facts about the user (preferences, allergies, goals, plans) and "
+                        "decisions made. Reply with the summary only, at most 120 words.")
+        lines = [f"{turn['role']}: {turn['content']}" for turn in turns]
+
+        # Oldest turns first, in as many requests as the input budget needs,
+        # so no message is dropped; only a single oversized turn gets cut
+        while lines:
+            current = f"\n\nCurrent summary:\n{summary or '(none)'}"
+            room = budget.max_input_tokens - budget.estimate(instructions + current + "\n\nNew messages:\n")
+            batch = budget.take(lines, room, separator="\n") or lines[:1]
+            lines = lines[len(batch):]
+            prompt = budget.fill([
+                (0, instructions, False),
+                (1, current, True),
+                (2, "\n\nNew messages:\n" + "\n".join(batch), True)
+            ])
+            summary = self.hackclub_ai(prompt, budget=budget)
+        return summary
+
+    def hackclub_ai(self, prompt, retries=None, use_cache=False, on_delta=None, response_format=None,
+                    validate=None, budget=None, system=None, history=None, cancelled=None):
+        """Call Groq API (streams deltas to on_delta when given; validate raises ValueError to reject a reply)
+
+        Once the cancelled event is set, the call raises Cancelled before the
+        next attempt or stream chunk, closing the upstream connection.
+        """
+        data = {
+            "model": "openai/gpt-oss-20b",
+            "messages": [
+                {"role": "system", "content": system or "You are a helpful AI nutritionist."},
+                *(history or []),
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+        }
+        if response_format:
+            data["response_format"] = response_format
+        if budget:
+            data["max_tokens"] = budget.max_output_tokens
+
+        cache_key = None
+        if use_cache:
+            key_text = prompt + json.dumps(response_format, sort_keys=True) if response_format else prompt
+            if system or history:
+                key_text = json.dumps(data["messages"]) + key_text
+            cache_key = ResponseCache.make_key(key_text, data["model"], data["temperature"])
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                try:
+                    if validate:
+                        validate(cached)
+                    return cached
+                except ValueError:
+                    pass
+
+        # Message text plus a few tokens of per-message framing
+        prompt_tokens = sum(PromptBudget.estimate(m["content"]) + 4 for m in data["messages"])
+        self.record_prompt(budget.name if budget else "other", prompt_tokens, data.get("max_tokens"))
+
+        retries = retries or self.retry_policy.retries
+        streamed = False
+        for attempt in range(retries):
+            Cancelled.check(cancelled)
+            self.rate_limiter.acquire()
+            try:
+                if on_delta:
+                    parts = []
+                    for delta in self.llm.stream_chat_completion(data):
+                        Cancelled.check(cancelled)
+                        streamed = True
+                        parts.append(delta)
+                        on_delta(delta)
+                    message = "".join(parts).strip()
+                else:
+                    result = self.llm.chat_completion(data)
+                    message = result["choices"][0]["message"]["content"].strip()
+                Cancelled.check(cancelled)
+                if validate:
+                    validate(message)
+                if cache_key:
+                    self.response_cache.put(cache_key, message)
+                return message
+            except Cancelled:
+                raise
+            except Exception as e:
+                # A reset hours away (e.g. a daily quota) fails this call below;
+                # pausing for it would stall every other request as well
+                hint = self.retry_policy.server_hint(e)
+                if hint and hint <= self.retry_policy.max_delay:
+                    self.rate_limiter.pause(hint)
+
+                # Retrying after partial output would duplicate streamed text
+                delay = None
+                if attempt < retries - 1 and not streamed and self.retry_policy.is_retryable(e):
+                    delay = self.retry_policy.delay(attempt, e)
+                if delay is None:
+                    raise Exception(f"Failed after {attempt + 1} attempts: {e}") from e
+                if cancelled is not None:
+                    cancelled.wait(delay)  # wakes early on cancel; checked next attempt
+                else:
+                    time.sleep(delay)
+
+    def quicksort(self, arr):
+        """Quicksort algorithm"""
+        if len(arr) <= 1:
+            return arr
+        pivot = arr[len(arr) // 2]
+        left = [x for x in arr if x < pivot]
+        middle = [x for x in arr if x == pivot]
+        right = [x for x in arr if x > pivot]
+        return self.quicksort(left) + middle + self.quicksort(right)
+
+    def binary_search(self, arr, target):
+        """Binary search for closest value"""
+        if not arr:
+            return 0
+        lower, higher = 0, len(arr) - 1
+        while lower < higher:
+            middle = (lower + higher) // 2
+            if target == arr[middle]:
+                return middle
+            elif target > arr[middle]:
+                lower = middle + 1
+            else:
+                higher = middle
+        if lower >= len(arr):
+            lower = len(arr) - 1
+        if lower > 0 and abs(arr[lower] - target) > abs(arr[lower - 1] - target):
+            lower -= 1
+        return lower
+
+    def score_matrix(self, goals, recipes):
+        """Vectorized recipe scores for an (N x 4) nutrient matrix and a goal vector"""
+        return self.score_batch([goals], recipes)[0]
+
+    def score_batch(self, goal_matrix, recipes, block_elements=4_000_000):
+        """(M x N) scores of N recipes against M goal vectors in one vectorized pass"""
+        matrix = np.asarray(recipes, dtype=float)
+        goal_matrix = np.asarray(goal_matrix, dtype=float)
+        n = matrix.shape[0]
+        cols = np.arange(matrix.shape[1])
+
+        # Sort each nutrient column once and share it across every goal vector
+        sorted_cols = np.sort(matrix, axis=0)
+
+        # Closest value to each goal, same rule as binary_search: the first
+        # value >= goal unless the one below it is strictly closer
+        idx = np.empty(goal_matrix.shape, dtype=int)
+        for j in cols:
+            idx[:, j] = np.searchsorted(sorted_cols[:, j], goal_matrix[:, j], side="left")
+        idx = np.minimum(idx, n - 1)
+        upper = sorted_cols[idx, cols]
+        lower = sorted_cols[np.maximum(idx - 1, 0), cols]
+        use_lower = (idx > 0) & (np.abs(lower - goal_matrix) < np.abs(upper - goal_matrix))
+        ideal = np.where(use_lower, lower, upper)
+
+        # Score in row blocks so the (M x N x 4) intermediate stays bounded
+        scores = np.empty((goal_matrix.shape[0], n))
+        rows = max(1, block_elements // max(1, matrix.size))
+        for start in range(0, goal_matrix.shape[0], rows):
+            goal_block = goal_matrix[start:start + rows, None, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                per_nutrient = 1 - np.abs(ideal[start:start + rows, None, :] - matrix) / goal_block
+            per_nutrient = np.where(goal_block != 0, np.clip(per_nutrient, 0.0, 1.0), 1.0)
+            scores[start:start + rows] = per_nutrient.mean(axis=2)
+        return scores
+
+    def score_many(self, goal_matrix, recipes):
+        """M x N score lists (one row per goal vector), in recipe order"""
+        if not recipes or not goal_matrix:
+            return [[] for _ in goal_matrix]
+        if np is None:
+            return [self.score_recipes(goals, recipes) for goals in goal_matrix]
+        return self.score_batch(goal_matrix, recipes).tolist()
+
+    def top_k_many(self, goal_matrix, recipes, k):
+        """Per-goal-vector top-k (index, score) pairs, ties broken by index"""
+        if not recipes or not goal_matrix or k <= 0:
+            return [[] for _ in goal_matrix]
+        if np is None:
+            return [self.top_k(scores, k) for scores in self.score_many(goal_matrix, recipes)]
+
+        scores = self.score_batch(goal_matrix, recipes)
+        k = min(k, scores.shape[1])
+        results = []
+        for row in scores:
+            # Partial selection finds the k-th best score; everything tied
+            # with it is kept so the index tie-break stays exact
+            threshold = np.partition(row, row.size - k)[row.size - k]
+            candidates = np.nonzero(row >= threshold)[0]
+            order = np.lexsort((candidates, -row[candidates]))[:k]
+            results.append([(int(i), float(row[i])) for i in candidates[order]])
+        return results
+
+    def score_recipes(self, goals, recipes):
+        """Unsorted per-recipe scores, in recipe order"""
+        if not recipes or not goals:
+            return []
+        if np is None:
+            scores = [0.0] * len(recipes)
+            for idx, score in self.calculate_score(goals, recipes):
+                scores[idx] = score
+            return scores
+        return self.score_matrix(goals, recipes).tolist()
+
+    def top_k(self, scores, k):
+        """Top-k (index, score) pairs by heap selection, ties broken by index"""
+        return heapq.nsmallest(k, enumerate(scores), key=lambda item: (-item[1], item[0]))
+
+    def calculate_score(self, goals, recipes):
+        """Calculate recipe scores (reference implementation)"""
+        if not recipes or not goals:
+            return []
+
+        scores = [0.0] * len(recipes)
+
+        for goal_idx in range(len(goals)):
+            goal = goals[goal_idx]
+            values = [recipe[goal_idx] for recipe in recipes]
+            sorted_values = self.quicksort(values)
+            closest_idx = self.binary_search(sorted_values, goal)
+            ideal_value = sorted_values[closest_idx]
+
+            for recipe_idx in range(len(recipes)):
+                recipe_value = recipes[recipe_idx][goal_idx]
+                diff = abs(ideal_value - recipe_value)
+                score = 1 - (diff / goal) if goal != 0 else 1.0
+                score = max(0.0, min(score, 1.0))
+                scores[recipe_idx] += score
+
+        scores = [score / len(goals) for score in scores]
+        indexed_scores = [(i, scores[i]) for i in range(len(recipes))]
+        indexed_scores.sort(key=lambda x: x[1], reverse=True)
+
+        return indexed_scores
@@ -1,11 +1,11 @@
 import customtkinter as ctk
-import requests
-import json
-import time
+import functools
 import threading
 import webbrowser
 import random
 
+from planner import ChatSession, NutritionPlanner, RequestScheduler, SessionStore
+
 # Set appearance
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("green")
@@ -23,10 +23,64 @@ class NutritionPlannerApp(ctk.CTk):
         # Data storage
         self.nutrition_goals = {}
         self.current_dishes = []
+        self.dish_pool = []
+        self.ingredients = []
+        self.plan_meals = 3
+        self.plan_portions = (0.5, 1.0, 1.5)
+        self.week_plan = None
+        self._week_day_frames = []
+        self.display_dish_count = 12
+        
+        # Progressive dish rendering state (latest ranked snapshot from the worker)
+        self._dish_stream_lock = threading.Lock()
+        self._pending_dishes = None
+        self._dishes_streaming = False
+        self._dish_job = None
+        self._dish_generation = 0  # bumped per new generate job; older snapshots are stale
         self.selected_dish = None
         self.chat_history = []
         self.ai_personality = "friendly and supportive"
         
+        # All LLM work goes through one bounded scheduler; results come back
+        # to the Tk loop through its queue, drained every ui_poll_ms
+        self.scheduler = RequestScheduler(
+            max_workers=4,
+            limits={"analyze": 1, "generate": 1, "chat": 1, "plan": 1, "session": 1, "summary": 1}
+        )
+        self.ui_poll_ms = 30
+        self.after(self.ui_poll_ms, self._drain_ui_queue)
+        
+        # Streaming chat state (deltas are flushed to the textbox in batches)
+        self._stream_lock = threading.Lock()
+        self._stream_buffer = []
+        self._stream_flush_pending = False
+        self._stream_active = False
+        self._stream_started = False
+        
+        # Incremental chat rendering: messages already in the textbox and a
+        # cap on how many are drawn at once
+        self.max_rendered_messages = 200
+        self._chat_rendered = 0
+        self._chat_first_rendered = 0
+        
+        # Headless engine that does all LLM calls, parsing and scoring
+        self.planner = NutritionPlanner(self.GROQ_API_KEY, cache_path="dna_buddy_cache.db")
+
+        # What the model remembers of the chat: recent turns plus a rolling summary
+        self.chat_session = ChatSession(self.planner, window=8, scheduler=self.scheduler)
+        
+        # Goals, dishes and chat survive restarts; the last session is read in
+        # the background and the chat only when the chat window needs it
+        self.session_store = SessionStore("dna_buddy_sessions.db")
+        self._saved_session = None
+        self._chat_loaded = True
+        self.scheduler.submit(
+            "session", self.session_store.latest,
+            ("nutrition_goals", "dish_pool", "current_dishes", "ingredients", "chat_summary"),
+            on_done=self._on_session_loaded
+        )
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Animation variables
         self.stars = []
         self.scroll_offset = 0
@@ -35,6 +89,47 @@ class NutritionPlannerApp(ctk.CTk):
         # Show hero page first
         self.show_hero_page()
     
+    def on_close(self):
+        """Release resources and close the app"""
+        self.animation_running = False
+        self.scheduler.shutdown()
+        if self.chat_session.summary:
+            self.session_store.save("chat_summary", self.chat_session.summary)
+        self.session_store.close()
+        self.planner.close()
+        self.destroy()
+    
+    def _on_session_loaded(self, saved):
+        """Remember the last session so start_app can resume it"""
+        if saved and saved.get("nutrition_goals") and saved.get("current_dishes"):
+            self._saved_session = saved
+    
+    def _resume_session(self):
+        """Restore the saved goals and dishes and jump straight to the dishes"""
+        saved, self._saved_session = self._saved_session, None
+        self.nutrition_goals = saved["nutrition_goals"]
+        self.dish_pool = saved.get("dish_pool") or saved["current_dishes"]
+        self.current_dishes = saved["current_dishes"]
+        self.ingredients = saved.get("ingredients", [])
+        self.chat_session.summary = saved.get("chat_summary", "")
+        self._chat_loaded = False
+        self.show_step_3()
+    
+    def _on_chat_loaded(self, messages):
+        """Put the saved chat in front of anything typed since startup"""
+        self.chat_history = messages + self.chat_history
+        for message in messages[-self.chat_session.window:]:
+            self.chat_session.add(message["role"], message["content"])
+        if hasattr(self, "chat_display") and self.chat_display.winfo_exists():
+            self.refresh_chat_display(full=True)
+    
+    def _drain_ui_queue(self):
+        """Deliver background results to the UI"""
+        try:
+            self.scheduler.drain()
+        finally:
+            self.after(self.ui_poll_ms, self._drain_ui_queue)
+    
     def show_hero_page(self):
         """Display hero landing page with animations"""
         # Clear window
@@ -338,7 +433,10 @@ class NutritionPlannerApp(ctk.CTk):
         )
         self.content_frame.pack(pady=20, fill="both", expand=True, padx=20)
         
-        self.show_step_1()
+        if self._saved_session:
+            self._resume_session()
+        else:
+            self.show_step_1()
     
     def update_progress(self, step):
         """Update progress indicator"""
@@ -404,7 +502,7 @@ class NutritionPlannerApp(ctk.CTk):
         self.dna_textbox.insert("1.0", "Age: 30, Height: 5'10\", Weight: 180lbs, Active lifestyle, No allergies")
         
         limit_label = ctk.CTkLabel(
-            section_frame, text="(Maximum 500 characters)",
+            section_frame, text="(Longer profiles are shortened to fit the AI prompt)",
             font=ctk.CTkFont(size=10), text_color=("#666666", "#666666")
         )
         limit_label.pack(pady=(0, 10))
@@ -445,53 +543,31 @@ class NutritionPlannerApp(ctk.CTk):
             self.show_error("Please enter your profile information")
             return
         
-        if len(dna_text) > 500:
-            self.show_error("Input too long. Using first 500 characters only.")
-            dna_text = dna_text[:500]
-        
+        # Long profiles are trimmed to the prompt budget by the planner
         self.show_loading("Analyzing your profile with AI...")
         
-        thread = threading.Thread(
-            target=self._analyze_dna_thread,
-            args=(dna_text, self.goal_var.get())
+        goal = self.goal_var.get()
+        self.scheduler.submit(
+            "analyze", self.planner.analyze_profile, dna_text, goal,
+            key=(dna_text, goal),
+            on_done=self._on_profile_analyzed, on_error=self._on_profile_error
         )
-        thread.daemon = True
-        thread.start()
     
-    def _analyze_dna_thread(self, dna_text, goal):
-        """Thread for DNA analysis"""
-        try:
-            dna_text_limited = dna_text[:500]
-            
-            response = self.hackclub_ai(f"""DNA profile: {dna_text_limited}
-Goal: {goal}
-
-Create a nutrition plan with daily targets. Return ONLY JSON:
-{{"calories": <number>, "protein": <number>, "carbs": <number>, "fats": <number>, "exercise_plan": "<brief plan>"}}""")
-            
-            if '{' in response and '}' in response:
-                json_start = response.index('{')
-                json_end = response.rindex('}') + 1
-                json_str = response[json_start:json_end]
-                recommendations = json.loads(json_str)
-            else:
-                recommendations = {
-                    "calories": 2000, "protein": 150, "carbs": 200,
-                    "fats": 65, "exercise_plan": "Regular exercise recommended"
-                }
-            
-            self.nutrition_goals = {
-                'calories': float(recommendations.get('calories', 2000)),
-                'protein': float(recommendations.get('protein', 150)),
-                'carbs': float(recommendations.get('carbs', 200)),
-                'fats': float(recommendations.get('fats', 65)),
-                'exercise_plan': recommendations.get('exercise_plan', 'Regular exercise recommended')
-            }
-            
-            self.after(0, self.show_step_2)
-            
-        except Exception as e:
-            self.after(0, lambda: self.show_error(f"Failed to analyze profile: {str(e)}"))
+    def _on_profile_analyzed(self, goals):
+        """Store analyzed goals and move to step 2"""
+        self.nutrition_goals = goals
+        
+        # A new profile starts a new saved session with a fresh chat
+        self.session_store.new_session()
+        self.session_store.save("nutrition_goals", goals)
+        self.chat_history = []
+        self.chat_session.clear()
+        self._chat_loaded = True
+        self.show_step_2()
+    
+    def _on_profile_error(self, error):
+        """Report a failed profile analysis"""
+        self.show_error(f"Failed to analyze profile: {str(error)}")
     
     def show_step_2(self):
         """Step 2: Display Goals"""
@@ -605,76 +681,93 @@ Create a nutrition plan with daily targets. Return ONLY JSON:
             self.show_error("Please enter at least one ingredient")
             return
         
+        self.ingredients = ingredients
         self.show_loading("Creating personalized meal recommendations...")
         
-        thread = threading.Thread(target=self._generate_dishes_thread, args=(ingredients,))
-        thread.daemon = True
-        thread.start()
+        self._dishes_streaming = True
+        generation = self._dish_generation + 1
+        job = self.scheduler.submit(
+            "generate", self.planner.generate_dishes, ingredients, self.nutrition_goals,
+            self.display_dish_count, functools.partial(self._queue_partial_dishes, generation),
+            key=self.planner.canonicalizer.cache_key(ingredients),
+            on_done=functools.partial(self._on_dishes_generated, generation),
+            on_error=functools.partial(self._on_dishes_error, generation),
+            cancellable=True
+        )
+        # A coalesced duplicate keeps streaming under the running job's generation
+        if job is not self._dish_job:
+            self._dish_job = job
+            self._dish_generation = generation
     
-    def _generate_dishes_thread(self, ingredients):
-        """Thread for dish generation"""
-        try:
-            meal_calories = self.nutrition_goals['calories'] / 3
-            meal_protein = self.nutrition_goals['protein'] / 3
-            meal_carbs = self.nutrition_goals['carbs'] / 3
-            meal_fats = self.nutrition_goals['fats'] / 3
-
-            ingredients_limited = ingredients[:10]
-
-            prompt = f"""Generate 20 meal dishes using these ingredients: {', '.join(ingredients_limited)}.
-Strictly follow this format for each dish (one per line):
-
-DishNameWithoutColonsOrCommas: Calories, Protein (g), Carbs (g), Fats (g)
-
-Example:
-Grilled Chicken Salad: 400, 30, 20, 15
-Quinoa Veggie Bowl: 350, 15, 50, 10
-"""
-            ai_response = self.hackclub_ai(prompt)
-
-            dishes = []
-            for line in ai_response.strip().split('\n'):
-                if ':' not in line:
-                    continue
-                try:
-                    name_part, nutrients_part = line.split(':', 1)
-                    nutrients = [n.strip() for n in nutrients_part.split(',')]
-
-                    if len(nutrients) != 4:
-                        continue
-
-                    dishes.append({
-                        "name": name_part.strip(),
-                        "description": "",
-                        "calories": float(nutrients[0]),
-                        "protein": float(nutrients[1]),
-                        "carbs": float(nutrients[2]),
-                        "fats": float(nutrients[3])
-                    })
-                except:
-                    continue
-
-            if not dishes:
-                raise Exception("No valid dishes returned from AI.")
-
-            goals = [meal_calories, meal_protein, meal_carbs, meal_fats]
-            recipe_nutrients = [[d['calories'], d['protein'], d['carbs'], d['fats']] for d in dishes]
-
-            scored = self.calculate_score(goals, recipe_nutrients)
-
-            for idx, score in scored:
-                dishes[idx]['score'] = round(score, 3)
-                dishes[idx]['dish_id'] = idx
-
-            dishes.sort(key=lambda x: x['score'], reverse=True)
-            self.current_dishes = dishes
-
-            self.after(0, self.show_step_3)
-
-        except Exception as ex:
-            self.after(0, lambda ex=ex: self.show_error(f"Failed to generate dishes: {ex}"))
+    def _queue_partial_dishes(self, generation, top):
+        """Hand the latest ranked snapshot to the UI (called from worker threads)"""
+        if generation < self._dish_generation:
+            return  # from a job that was cancelled or replaced
+        with self._dish_stream_lock:
+            pending = self._pending_dishes is not None
+            self._pending_dishes = (generation, [dict(d) for d in top])
+        if not pending:
+            self.scheduler.call_soon(self._flush_partial_dishes)
+    
+    def _flush_partial_dishes(self):
+        """Show the latest partial ranking while generation continues"""
+        with self._dish_stream_lock:
+            pending = self._pending_dishes
+            self._pending_dishes = None
+        # Snapshots from cancelled or replaced jobs are dropped
+        if not pending or not self._dishes_streaming:
+            return
+        generation, top = pending
+        if generation != self._dish_generation or not top:
+            return
+        
+        self.current_dishes = top
+        if self._dishes_frame_visible():
+            self._render_dish_cards()
+        else:
+            self.show_step_3(streaming=True)
     
-    def show_step_3(self):
+    def _dishes_frame_visible(self):
+        """Whether step 3 is currently on screen"""
+        frame = getattr(self, "dishes_frame", None)
+        return frame is not None and frame.winfo_exists()
+    
+    def _on_dishes_generated(self, generation, result):
+        """Store ranked dishes and move to step 3"""
+        if not self._dishes_streaming or generation != self._dish_generation:
+            return  # abandoned via "New Profile" or replaced
+        self._dishes_streaming = False
+        with self._dish_stream_lock:
+            self._pending_dishes = None
+        
+        self.dish_pool, self.current_dishes = result
+        self.session_store.save("ingredients", self.ingredients)
+        self.session_store.save("dish_pool", self.dish_pool)
+        self.session_store.save("current_dishes", self.current_dishes)
+        if self._dishes_frame_visible():
+            self._render_dish_cards()
+            self.dish_status_label.configure(text="")
+        else:
+            self.show_step_3()
+    
+    def _on_dishes_error(self, generation, error):
+        """Report a failed dish generation"""
+        if not self._dishes_streaming or generation != self._dish_generation:
+            return
+        self._dishes_streaming = False
+        self.show_error(f"Failed to generate dishes: {error}")
+    
+    def _start_new_profile(self):
+        """Abandon any running dish generation and go back to step 1"""
+        self.scheduler.cancel("generate")
+        self._dishes_streaming = False
+        self._dish_job = None
+        self._dish_generation += 1
+        with self._dish_stream_lock:
+            self._pending_dishes = None
+        self.show_step_1()
+    
+    def show_step_3(self, streaming=False):
         """Step 3: Display Dishes"""
         self.clear_content()
         self.update_progress(4)
@@ -694,12 +787,76 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         )
         subtitle.pack(pady=5)
         
-        dishes_frame = ctk.CTkScrollableFrame(
+        self.dish_status_label = ctk.CTkLabel(
+            header_frame, text="⏳ More dishes on the way..." if streaming else "",
+            font=ctk.CTkFont(size=12), text_color=("#88ddff", "#88ddff")
+        )
+        self.dish_status_label.pack()
+        
+        new_profile_btn = ctk.CTkButton(
+            header_frame, text="🧬 New Profile", command=self._start_new_profile,
+            width=140, height=30, font=ctk.CTkFont(size=12),
+            fg_color=("#3a3a4e", "#3a3a4e"), hover_color=("#4a4a5e", "#4a4a5e"), corner_radius=15
+        )
+        new_profile_btn.pack(pady=(5, 0))
+        
+        self.dishes_frame = ctk.CTkScrollableFrame(
             self.content_frame, height=450, fg_color="transparent"
         )
-        dishes_frame.pack(pady=10, padx=20, fill="both", expand=True)
+        self.dishes_frame.pack(pady=10, padx=20, fill="both", expand=True)
+        
+        self._render_dish_cards()
         
-        for i, dish in enumerate(self.current_dishes[:12]):
+        # Chat with DNA Buddy button
+        chat_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+        chat_frame.pack(pady=30)
+        
+        plan_btn = ctk.CTkButton(
+            chat_frame,
+            text="🗓️ Plan My Day",
+            command=self.plan_day,
+            height=50,
+            width=400,
+            font=ctk.CTkFont(size=16, weight="bold"),
+            fg_color=("#3a3a4e", "#3a3a4e"),
+            hover_color=("#4a4a5e", "#4a4a5e"),
+            corner_radius=25
+        )
+        plan_btn.pack(pady=(0, 15))
+        
+        week_btn = ctk.CTkButton(
+            chat_frame,
+            text="📅 Plan My Week",
+            command=self.plan_week,
+            height=50,
+            width=400,
+            font=ctk.CTkFont(size=16, weight="bold"),
+            fg_color=("#3a3a4e", "#3a3a4e"),
+            hover_color=("#4a4a5e", "#4a4a5e"),
+            corner_radius=25
+        )
+        week_btn.pack(pady=(0, 15))
+        
+        chat_btn = ctk.CTkButton(
+            chat_frame,
+            text="💬 Chat with DNA Buddy",
+            command=self.show_chat_window,
+            height=60,
+            width=400,
+            font=ctk.CTkFont(size=18, weight="bold"),
+            fg_color=("#00ff88", "#00cc66"),
+            hover_color=("#00cc66", "#00aa55"),
+            corner_radius=30
+        )
+        chat_btn.pack()
+    
+    def _render_dish_cards(self):
+        """(Re)draw the ranked dish cards"""
+        dishes_frame = self.dishes_frame
+        for widget in dishes_frame.winfo_children():
+            widget.destroy()
+        
+        for i, dish in enumerate(self.current_dishes[:self.display_dish_count]):
             dish_card = ctk.CTkFrame(
                 dishes_frame, fg_color=("#2a2a3e", "#2a2a3e"),
                 corner_radius=15, border_width=2,
@@ -782,23 +939,169 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
                 hover_color=("#00cc66", "#00aa55"), corner_radius=20
             )
             view_btn.pack(side="right")
+    
+    def plan_day(self):
+        """Pick the day's meals from the whole dish pool in the background"""
+        if len(self.dish_pool) < self.plan_meals:
+            self.show_error("Not enough dishes yet to plan a full day.")
+            return
         
-        # Chat with DNA Buddy button
-        chat_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        chat_frame.pack(pady=30)
+        self.scheduler.submit(
+            "plan", self.planner.plan_day, list(self.dish_pool), self.nutrition_goals,
+            self.plan_meals, self.plan_portions,
+            on_done=self.show_day_plan,
+            on_error=lambda e: self.show_error(f"Failed to plan your day: {e}")
+        )
+    
+    def show_day_plan(self, plan):
+        """Show the chosen meals and how their totals compare with the daily goals"""
+        plan_window = ctk.CTkToplevel(self)
+        plan_window.title("Your Day Plan")
+        plan_window.geometry("600x560")
+        plan_window.configure(fg_color=("#0a0a1f", "#0a0a1f"))
+        
+        plan_frame = ctk.CTkFrame(
+            plan_window, fg_color=("#1a1a2e", "#1a1a2e"), corner_radius=15
+        )
+        plan_frame.pack(pady=20, padx=20, fill="both", expand=True)
         
-        chat_btn = ctk.CTkButton(
-            chat_frame,
-            text="💬 Chat with DNA Buddy",
-            command=self.show_chat_window,
-            height=60,
-            width=400,
-            font=ctk.CTkFont(size=18, weight="bold"),
-            fg_color=("#00ff88", "#00cc66"),
-            hover_color=("#00cc66", "#00aa55"),
-            corner_radius=30
+        title = ctk.CTkLabel(
+            plan_frame, text="🗓️ Your Day Plan",
+            font=ctk.CTkFont(size=24, weight="bold"), text_color=("#00ff88", "#00ff88")
+        )
+        title.pack(pady=(20, 5))
+        
+        subtitle = ctk.CTkLabel(
+            plan_frame, text=f"Daily match: {plan['score'] * 100:.0f}%",
+            font=ctk.CTkFont(size=14), text_color=("#aaaaaa", "#aaaaaa")
+        )
+        subtitle.pack(pady=(0, 10))
+        
+        for meal_name, meal in zip(["🌅 Breakfast", "☀️ Lunch", "🌙 Dinner"] + ["🍴 Meal"] * 10, plan["meals"]):
+            dish = meal["dish"]
+            portion = f"{meal['portion']:g}× " if meal["portion"] != 1.0 else ""
+            meal_card = ctk.CTkFrame(
+                plan_frame, fg_color=("#2a2a3e", "#2a2a3e"), corner_radius=12
+            )
+            meal_card.pack(pady=6, padx=20, fill="x")
+            
+            ctk.CTkLabel(
+                meal_card, text=f"{meal_name}: {portion}{dish['name']}",
+                font=ctk.CTkFont(size=15, weight="bold"),
+                text_color=("#ffffff", "#ffffff"), anchor="w"
+            ).pack(pady=(10, 2), padx=15, fill="x")
+            
+            ctk.CTkLabel(
+                meal_card,
+                text=(f"{int(dish['calories'] * meal['portion'])} kcal · "
+                      f"{int(dish['protein'] * meal['portion'])}g protein · "
+                      f"{int(dish['carbs'] * meal['portion'])}g carbs · "
+                      f"{int(dish['fats'] * meal['portion'])}g fats"),
+                font=ctk.CTkFont(size=12), text_color=("#aaaaaa", "#aaaaaa"), anchor="w"
+            ).pack(pady=(0, 10), padx=15, fill="x")
+        
+        totals = plan["totals"]
+        goals = self.nutrition_goals
+        summary = "\n".join(
+            f"{label}: {int(totals[key])}{unit} of {int(goals[key])}{unit}"
+            for label, key, unit in [
+                ("🔥 Calories", "calories", " kcal"), ("🥩 Protein", "protein", "g"),
+                ("🌾 Carbs", "carbs", "g"), ("🥑 Fats", "fats", "g")
+            ]
+        )
+        totals_label = ctk.CTkLabel(
+            plan_frame, text=summary, font=ctk.CTkFont(size=14),
+            text_color=("#88ddff", "#88ddff"), justify="left"
+        )
+        totals_label.pack(pady=15)
+    
+    def plan_week(self):
+        """Plan seven days from the dish pool in the background"""
+        if len(self.dish_pool) < self.plan_meals:
+            self.show_error("Not enough dishes yet to plan a week.")
+            return
+        
+        self.scheduler.submit(
+            "plan", self.planner.plan_week, list(self.dish_pool), self.nutrition_goals,
+            self.ingredients, 7, self.plan_meals, self.plan_portions,
+            on_done=self.show_week_plan,
+            on_error=lambda e: self.show_error(f"Failed to plan your week: {e}")
+        )
+    
+    def show_week_plan(self, week):
+        """Show the week with a swap button on every meal"""
+        self.week_plan = week
+        week_window = ctk.CTkToplevel(self)
+        week_window.title("Your Week Plan")
+        week_window.geometry("760x700")
+        week_window.configure(fg_color=("#0a0a1f", "#0a0a1f"))
+        
+        title = ctk.CTkLabel(
+            week_window, text="📅 Your Week Plan",
+            font=ctk.CTkFont(size=24, weight="bold"), text_color=("#00ff88", "#00ff88")
+        )
+        title.pack(pady=(20, 5))
+        
+        subtitle = ctk.CTkLabel(
+            week_window, text="Press 🔄 to swap a meal; only that day is re-planned",
+            font=ctk.CTkFont(size=13), text_color=("#aaaaaa", "#aaaaaa")
+        )
+        subtitle.pack(pady=(0, 10))
+        
+        days_frame = ctk.CTkScrollableFrame(week_window, fg_color="transparent")
+        days_frame.pack(pady=10, padx=20, fill="both", expand=True)
+        
+        self._week_day_frames = []
+        for day in range(len(week.days)):
+            day_card = ctk.CTkFrame(days_frame, fg_color=("#2a2a3e", "#2a2a3e"), corner_radius=12)
+            day_card.pack(pady=6, padx=5, fill="x")
+            self._week_day_frames.append(day_card)
+            self._render_week_day(day)
+    
+    def _render_week_day(self, day):
+        """(Re)draw one day of the week plan"""
+        day_card = self._week_day_frames[day]
+        if not day_card.winfo_exists():
+            return
+        for widget in day_card.winfo_children():
+            widget.destroy()
+        
+        plan = self.week_plan.days[day]
+        day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        header = f"{day_names[day % 7]}  ·  {plan['score'] * 100:.0f}% match" if plan else day_names[day % 7]
+        ctk.CTkLabel(
+            day_card, text=header, font=ctk.CTkFont(size=15, weight="bold"),
+            text_color=("#00ff88", "#00ff88"), anchor="w"
+        ).pack(pady=(10, 4), padx=15, fill="x")
+        
+        if not plan:
+            return
+        for meal_index, meal in enumerate(plan["meals"]):
+            row = ctk.CTkFrame(day_card, fg_color="transparent")
+            row.pack(pady=2, padx=15, fill="x")
+            
+            portion = f"{meal['portion']:g}× " if meal["portion"] != 1.0 else ""
+            ctk.CTkLabel(
+                row, text=f"🍽️ {portion}{meal['dish']['name']}  ({int(meal['dish']['calories'] * meal['portion'])} kcal)",
+                font=ctk.CTkFont(size=13), text_color=("#ffffff", "#ffffff"), anchor="w"
+            ).pack(side="left")
+            
+            ctk.CTkButton(
+                row, text="🔄", width=36, height=28,
+                command=lambda d=day, m=meal_index: self.swap_week_meal(d, m),
+                fg_color=("#3a3a4e", "#3a3a4e"), hover_color=("#4a4a5e", "#4a4a5e"), corner_radius=14
+            ).pack(side="right")
+        
+        ctk.CTkFrame(day_card, fg_color="transparent", height=6).pack()
+    
+    def swap_week_meal(self, day, meal):
+        """Swap one meal; the planner re-solves just that day"""
+        self.scheduler.submit(
+            "plan", self.week_plan.swap, day, meal,
+            on_done=lambda _: self._render_week_day(day),
+            on_error=lambda e: self.show_error(f"Failed to swap the meal: {e}"),
+            replace=False
         )
-        chat_btn.pack()
     
     def show_chat_window(self):
         """Show chat window with AI personality options"""
@@ -870,6 +1173,8 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         personality_menu.pack(pady=(0, 15), padx=20)
         
         # Chat history display
+        self._chat_rendered = 0
+        self._chat_first_rendered = 0
         self.chat_display = ctk.CTkTextbox(
             main_container,
             height=350,
@@ -880,9 +1185,13 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         )
         self.chat_display.pack(pady=15, padx=30, fill="both", expand=True)
         self.chat_display.configure(state="disabled")
+        self._configure_chat_tags()
         
-        # Display existing chat history
-        self.refresh_chat_display()
+        # Display existing chat history (a resumed session's chat loads in the background)
+        self.refresh_chat_display(full=True)
+        if not self._chat_loaded:
+            self._chat_loaded = True
+            self.scheduler.submit("session", self.session_store.messages, on_done=self._on_chat_loaded)
         
         # Input frame
         input_frame = ctk.CTkFrame(main_container, fg_color="transparent")
@@ -932,27 +1241,41 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         """Update AI personality"""
         self.ai_personality = choice
     
-    def refresh_chat_display(self):
-        """Refresh the chat display with history"""
+    def _configure_chat_tags(self):
+        """Configure chat text colors once per chat window"""
+        self.chat_display.tag_config("welcome", foreground="#aaaaaa")
+        self.chat_display.tag_config("user_label", foreground="#00ff88")
+        self.chat_display.tag_config("user_text", foreground="#ffffff")
+        self.chat_display.tag_config("ai_label", foreground="#88ddff")
+        self.chat_display.tag_config("ai_text", foreground="#cccccc")
+        self.chat_display.tag_config("thinking", foreground="#aaaaaa")
+    
+    def refresh_chat_display(self, full=False):
+        """Append new chat messages (full redraw only when needed)"""
         self.chat_display.configure(state="normal")
-        self.chat_display.delete("1.0", "end")
         
-        if not self.chat_history:
-            self.chat_display.insert("end", "Welcome! Ask me anything about nutrition, recipes, or your meal plan.\n\n", "welcome")
-            self.chat_display.tag_config("welcome", foreground="#aaaaaa")
-        else:
-            for message in self.chat_history:
-                if message['role'] == 'user':
-                    self.chat_display.insert("end", "You: ", "user_label")
-                    self.chat_display.insert("end", f"{message['content']}\n\n", "user_text")
-                else:
-                    self.chat_display.insert("end", "DNA Buddy: ", "ai_label")
-                    self.chat_display.insert("end", f"{message['content']}\n\n", "ai_text")
+        # Redraw from scratch on clear, on a new window, or when the
+        # rendered history has grown well past the cap
+        overflow = self._chat_rendered - self._chat_first_rendered > self.max_rendered_messages + 50
+        if full or self._chat_rendered == 0 or self._chat_rendered > len(self.chat_history) or overflow:
+            self.chat_display.delete("1.0", "end")
             
-            self.chat_display.tag_config("user_label", foreground="#00ff88")
-            self.chat_display.tag_config("user_text", foreground="#ffffff")
-            self.chat_display.tag_config("ai_label", foreground="#88ddff")
-            self.chat_display.tag_config("ai_text", foreground="#cccccc")
+            if not self.chat_history:
+                self.chat_display.insert("end", "Welcome! Ask me anything about nutrition, recipes, or your meal plan.\n\n", "welcome")
+            
+            self._chat_first_rendered = max(0, len(self.chat_history) - self.max_rendered_messages)
+            if self._chat_first_rendered:
+                self.chat_display.insert("end", f"({self._chat_first_rendered} earlier messages hidden)\n\n", "welcome")
+            self._chat_rendered = self._chat_first_rendered
+        
+        for message in self.chat_history[self._chat_rendered:]:
+            if message['role'] == 'user':
+                self.chat_display.insert("end", "You: ", "user_label")
+                self.chat_display.insert("end", f"{message['content']}\n\n", "user_text")
+            else:
+                self.chat_display.insert("end", "DNA Buddy: ", "ai_label")
+                self.chat_display.insert("end", f"{message['content']}\n\n", "ai_text")
+        self._chat_rendered = len(self.chat_history)
         
         self.chat_display.configure(state="disabled")
         self.chat_display.see("end")
@@ -961,11 +1284,13 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         """Send a message to the AI"""
         message = self.chat_input.get().strip()
         
-        if not message:
+        # One reply at a time; ignore sends while the previous one streams
+        if not message or self._stream_active:
             return
         
         # Add user message to history
         self.chat_history.append({"role": "user", "content": message})
+        self.session_store.append_message("user", message)
         
         # Clear input
         self.chat_input.delete(0, "end")
@@ -975,68 +1300,95 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
         
         # Show loading
         self.chat_display.configure(state="normal")
+        self.chat_display.mark_set("pending_reply", "end-1c")
+        self.chat_display.mark_gravity("pending_reply", "left")
         self.chat_display.insert("end", "DNA Buddy: ", "ai_label")
+        self.chat_display.mark_set("reply_start", "end-1c")
+        self.chat_display.mark_gravity("reply_start", "left")
         self.chat_display.insert("end", "Thinking...\n\n", "thinking")
-        self.chat_display.tag_config("ai_label", foreground="#88ddff")
-        self.chat_display.tag_config("thinking", foreground="#aaaaaa")
         self.chat_display.configure(state="disabled")
         self.chat_display.see("end")
         
-        # Get AI response in thread
-        thread = threading.Thread(
-            target=self._get_chat_response_thread,
-            args=(message,)
+        with self._stream_lock:
+            self._stream_buffer = []
+            self._stream_active = True
+            self._stream_started = False
+        
+        # Get AI response in the background
+        self.scheduler.submit(
+            "chat", self._get_chat_response_thread, message,
+            on_done=self._finish_chat_stream, replace=False
         )
-        thread.daemon = True
-        thread.start()
     
     def _get_chat_response_thread(self, message):
-        """Get AI response in thread"""
+        """Get AI response (worker)"""
         try:
-            # Build context with personality and nutrition goals
-            context = f"You are a {self.ai_personality} nutrition AI assistant named DNA Buddy. "
-            
-            if self.nutrition_goals:
-                context += f"\n\nUser's nutrition goals:\n"
-                context += f"- Daily calories: {int(self.nutrition_goals['calories'])} kcal\n"
-                context += f"- Protein: {int(self.nutrition_goals['protein'])}g\n"
-                context += f"- Carbs: {int(self.nutrition_goals['carbs'])}g\n"
-                context += f"- Fats: {int(self.nutrition_goals['fats'])}g\n"
-            
-            if self.current_dishes:
-                context += f"\n\nRecommended dishes: {', '.join([d['name'] for d in self.current_dishes[:5]])}\n"
-            
-            # Personality prefix
-            personality_prefixes = {
-                "pirate chef": "Respond like a pirate chef. Use pirate language and cooking terms. ",
-                "zen wellness guru": "Respond like a zen wellness guru. Be calm, peaceful, and mindful. ",
-                "scientific researcher": "Respond like a scientific researcher. Use technical terms and cite studies. ",
-                "enthusiastic fitness coach": "Respond like an enthusiastic fitness coach. Be energetic and motivating! ",
-                "wise health mentor": "Respond like a wise health mentor. Be thoughtful and share wisdom. ",
-                "casual buddy": "Respond like a casual friend. Be relaxed and conversational. ",
-            }
-            
-            personality_prefix = personality_prefixes.get(self.ai_personality, "")
-            full_prompt = personality_prefix + context + f"\n\nUser question: {message}"
-            
-            # Get response
-            response = self.hackclub_ai(full_prompt)
-            
-            # Add AI response to history
-            self.chat_history.append({"role": "assistant", "content": response})
-            
-            # Update UI
-            self.after(0, self.refresh_chat_display)
+            # Stream the response into the chat window as it arrives
+            return self.planner.chat(
+                message, self.nutrition_goals, self.current_dishes,
+                self.ai_personality, on_delta=self._queue_chat_delta,
+                session=self.chat_session
+            )
             
         except Exception as e:
-            error_msg = f"Sorry, I encountered an error: {str(e)}"
-            self.chat_history.append({"role": "assistant", "content": error_msg})
-            self.after(0, self.refresh_chat_display)
+            return f"Sorry, I encountered an error: {str(e)}"
+    
+    def _queue_chat_delta(self, delta):
+        """Buffer a streamed delta and schedule a batched flush (called from worker thread)"""
+        with self._stream_lock:
+            if not self._stream_active:
+                return
+            self._stream_buffer.append(delta)
+            if self._stream_flush_pending:
+                return
+            self._stream_flush_pending = True
+        self.scheduler.call_soon(self._flush_chat_stream)
+    
+    def _flush_chat_stream(self):
+        """Append buffered deltas to the chat display"""
+        with self._stream_lock:
+            text = "".join(self._stream_buffer)
+            self._stream_buffer = []
+            self._stream_flush_pending = False
+            if not self._stream_active or not text:
+                return
+            first_chunk = not self._stream_started
+            self._stream_started = True
+        
+        if not self.chat_display.winfo_exists() or "reply_start" not in self.chat_display.mark_names():
+            return
+        
+        self.chat_display.configure(state="normal")
+        if first_chunk:
+            # Replace the "Thinking..." placeholder
+            self.chat_display.delete("reply_start", "end")
+            text = text.lstrip()
+        self.chat_display.insert("end", text, "ai_text")
+        self.chat_display.configure(state="disabled")
+        self.chat_display.see("end")
+    
+    def _finish_chat_stream(self, response):
+        """Stop streaming and store the final response"""
+        with self._stream_lock:
+            self._stream_active = False
+            self._stream_buffer = []
+        
+        self.chat_history.append({"role": "assistant", "content": response})
+        self.session_store.append_message("assistant", response)
+        if self.chat_display.winfo_exists():
+            # Drop the streamed placeholder; the final message is appended in its place
+            if "pending_reply" in self.chat_display.mark_names():
+                self.chat_display.configure(state="normal")
+                self.chat_display.delete("pending_reply", "end")
+                self.chat_display.mark_unset("pending_reply")
+            self.refresh_chat_display()
     
     def clear_chat(self):
         """Clear chat history"""
         self.chat_history = []
-        self.refresh_chat_display()
+        self.chat_session.clear()
+        self.session_store.clear_messages()
+        self.refresh_chat_display(full=True)
     
     def show_error(self, message):
         """Show error message"""
@@ -1066,91 +1418,7 @@ Quinoa Veggie Bowl: 350, 15, 50, 10
             hover_color=("#00cc66", "#00aa55"), corner_radius=20
         )
         ok_btn.pack(pady=20)
-    
-    def hackclub_ai(self, prompt, retries=3):
-        """Call Groq API"""
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "openai/gpt-oss-20b",
-            "messages": [
-                {"role": "system", "content": "You are a helpful AI nutritionist."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-        }
-
-        for attempt in range(retries):
-            try:
-                response = requests.post(url, headers=headers, json=data, timeout=60)
-                response.raise_for_status()
-                result = response.json()
-                message = result["choices"][0]["message"]["content"].strip()
-                return message
-            except Exception as e:
-                if attempt < retries - 1:
-                    time.sleep(2)
-                else:
-                    raise Exception(f"Failed after {retries} attempts: {e}")
-
-    def quicksort(self, arr):
-        """Quicksort algorithm"""
-        if len(arr) <= 1:
-            return arr
-        pivot = arr[len(arr) // 2]
-        left = [x for x in arr if x < pivot]
-        middle = [x for x in arr if x == pivot]
-        right = [x for x in arr if x > pivot]
-        return self.quicksort(left) + middle + self.quicksort(right)
-    
-    def binary_search(self, arr, target):
-        """Binary search for closest value"""
-        if not arr:
-            return 0
-        lower, higher = 0, len(arr) - 1
-        while lower < higher:
-            middle = (lower + higher) // 2
-            if target == arr[middle]:
-                return middle
-            elif target > arr[middle]:
-                lower = middle + 1
-            else:
-                higher = middle
-        if lower >= len(arr):
-            lower = len(arr) - 1
-        if lower > 0 and abs(arr[lower] - target) > abs(arr[lower - 1] - target):
-            lower -= 1
-        return lower
-    
-    def calculate_score(self, goals, recipes):
-        """Calculate recipe scores"""
-        if not recipes or not goals:
-            return []
-
-        scores = [0.0] * len(recipes)
-
-        for goal_idx in range(len(goals)):
-            goal = goals[goal_idx]
-            values = [recipe[goal_idx] for recipe in recipes]
-            sorted_values = self.quicksort(values)
-            closest_idx = self.binary_search(sorted_values, goal)
-            ideal_value = sorted_values[closest_idx]
-
-            for recipe_idx in range(len(recipes)):
-                recipe_value = recipes[recipe_idx][goal_idx]
-                diff = abs(ideal_value - recipe_value)
-                score = 1 - (diff / goal) if goal != 0 else 1.0
-                score = max(0.0, min(score, 1.0))
-                scores[recipe_idx] += score
-
-        scores = [score / len(goals) for score in scores]
-        indexed_scores = [(i, scores[i]) for i in range(len(recipes))]
-        indexed_scores.sort(key=lambda x: x[1], reverse=True)
 
-        return indexed_scores
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""Local HTTP API for the DNA Buddy planner.
+
+Usage:
+    python server.py --port 8000
+
+Endpoints (JSON in, JSON out):
+    POST /analyze   {"profile": "...", "goal": "muscle gain"}
+    POST /generate  {"ingredients": [...], "nutrition_goals": {...}, "top_k": 12}
+    POST /score     {"goals": [cal, protein, carbs, fats] or [[...], ...], "dishes": [{...}, ...],
+                     "top_k": 5}  (or "nutrition_goals": [{...}, ...] of daily goals)
+    POST /chat      {"message": "...", "nutrition_goals": {...}, "dishes": [...], "personality": "...",
+                     "history": [{"role": "user"|"assistant", "content": "..."}, ...]}
+    GET  /stats
+
+All clients share one NutritionPlanner, so upstream LLM connections are
+pooled and the response cache is shared. Identical concurrent requests are
+collapsed into a single upstream call.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from planner import DISH_SHARDS, ChatSession, NutritionPlanner
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 502: "Bad Gateway"
+}
+
+
+class HTTPError(Exception):
+    """Error that maps directly to an HTTP response"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PlannerServer:
+    """asyncio HTTP front end for a shared NutritionPlanner"""
+
+    NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+    def __init__(self, planner, max_workers=8, max_body=1 << 20):
+        self.planner = planner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="planner")
+        self.max_body = max_body
+        self.in_flight = {}  # request key -> asyncio.Future shared by identical requests
+        self.collapsed = 0
+        self.routes = {
+            "/analyze": self.analyze,
+            "/generate": self.generate,
+            "/score": self.score,
+            "/chat": self.chat
+        }
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Start listening; returns the asyncio server"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    await self.respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                close = headers.get("connection", "").lower() == "close"
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, close=False):
+        """Write a JSON response"""
+        body = json.dumps(payload, allow_nan=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        """Route a request and turn failures into error responses"""
+        try:
+            if path == "/stats" and method == "GET":
+                return 200, self.stats()
+            handler = self.routes.get(path)
+            if handler is None:
+                raise HTTPError(404, f"unknown endpoint {path}")
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "body must be JSON")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            return 200, await handler(request)
+        except HTTPError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            return 502, {"error": str(e)}
+
+    async def collapse(self, key, fn, *args):
+        """Run fn(*args) in the worker pool, sharing the result with identical concurrent requests"""
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.collapsed += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, lambda: fn(*args))
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    @staticmethod
+    def require(request, field, kind):
+        """Fetch a required field of the given type"""
+        value = request.get(field)
+        if not isinstance(value, kind) or not value:
+            raise HTTPError(400, f"'{field}' is required")
+        return value
+
+    @staticmethod
+    def strings(request, field):
+        """Fetch a required non-empty list of non-blank strings (stripped)"""
+        values = request.get(field)
+        if (not isinstance(values, list) or not values
+                or not all(isinstance(v, str) and v.strip() for v in values)):
+            raise HTTPError(400, f"'{field}' must be a list of non-blank strings")
+        return [v.strip() for v in values]
+
+    @staticmethod
+    def text(request, field, default):
+        """Fetch an optional string field, falling back to default when missing or blank"""
+        value = request.get(field)
+        if value is None:
+            return default
+        if not isinstance(value, str):
+            raise HTTPError(400, f"'{field}' must be a string")
+        return value.strip() or default
+
+    @staticmethod
+    def number(value):
+        """float(value), rejecting NaN and infinities"""
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"{value!r} is not a finite number")
+        return number
+
+    @staticmethod
+    def integer(request, field, default):
+        """Fetch an optional integer field"""
+        value = request.get(field, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"'{field}' must be an integer")
+
+    @classmethod
+    def daily_goals(cls, value, field="nutrition_goals"):
+        """Check a daily goals object has numeric calories, protein, carbs and fats"""
+        try:
+            return dict(value, **{name: cls.number(value[name]) for name in cls.NUTRIENTS})
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, f"'{field}' needs numeric {', '.join(cls.NUTRIENTS)}")
+
+    @staticmethod
+    def request_key(endpoint, request):
+        """Canonical key for collapsing identical requests"""
+        return endpoint + json.dumps(request, sort_keys=True)
+
+    async def analyze(self, request):
+        profile = self.require(request, "profile", str)
+        goal = self.text(request, "goal", "general health")
+        goals = await self.collapse(
+            self.request_key("analyze", {"profile": profile, "goal": goal}),
+            self.planner.analyze_profile, profile, goal
+        )
+        return {"nutrition_goals": goals}
+
+    async def generate(self, request):
+        ingredients = self.strings(request, "ingredients")
+        nutrition_goals = self.daily_goals(self.require(request, "nutrition_goals", dict))
+        top_k = self.integer(request, "top_k", 12)
+        pool, top = await self.collapse(
+            self.request_key("generate", {
+                "i": self.planner.canonicalizer.cache_key(ingredients),
+                "g": nutrition_goals, "k": top_k
+            }),
+            self.planner.generate_dishes, ingredients, nutrition_goals, top_k
+        )
+        return {"dishes": top, "candidates": len(pool)}
+
+    async def score(self, request):
+        dishes = self.require(request, "dishes", list)
+        try:
+            recipes = [[self.number(d[k]) for k in self.NUTRIENTS] for d in dishes]
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, "dishes need numeric calories, protein, carbs and fats")
+
+        if request.get("nutrition_goals"):
+            # Many users' daily goals -> per-meal targets
+            daily = self.require(request, "nutrition_goals", list)
+            goal_matrix = [self.planner.meal_goals(self.daily_goals(g)) for g in daily]
+            batched = True
+        else:
+            goals = self.require(request, "goals", list)
+            batched = isinstance(goals[0], list)
+            try:
+                goal_matrix = [[self.number(g) for g in row] for row in (goals if batched else [goals])]
+            except (TypeError, ValueError):
+                goal_matrix = None
+            if not goal_matrix or any(len(row) != len(self.NUTRIENTS) for row in goal_matrix):
+                raise HTTPError(400, "goals must be [calories, protein, carbs, fats] or a list of them")
+
+        # One vectorized pass over the shared dish matrix for every goal vector
+        loop = asyncio.get_running_loop()
+        if "top_k" in request:
+            k = self.integer(request, "top_k", None)
+            result = await loop.run_in_executor(
+                self.executor, self.planner.top_k_many, goal_matrix, recipes, k
+            )
+            result = [[{"index": i, "score": s} for i, s in row] for row in result]
+            return {"top": result if batched else result[0]}
+
+        result = await loop.run_in_executor(self.executor, self.planner.score_many, goal_matrix, recipes)
+        return {"scores": result if batched else result[0]}
+
+    async def chat(self, request):
+        message = self.require(request, "message", str)
+        personality = self.text(request, "personality", "friendly and supportive")
+        nutrition_goals = request.get("nutrition_goals")
+        if nutrition_goals:
+            nutrition_goals = self.daily_goals(nutrition_goals)
+        dishes = request.get("dishes")
+        if dishes and not (isinstance(dishes, list) and all(isinstance(d, dict) and "name" in d for d in dishes)):
+            raise HTTPError(400, "'dishes' must be a list of objects with a name")
+
+        # Clients own their history; recent turns that fit the budget are sent
+        session = None
+        if request.get("history"):
+            session = ChatSession(summarize=False)
+            for turn in request["history"]:
+                if not isinstance(turn, dict) or turn.get("role") not in ("user", "assistant"):
+                    raise HTTPError(400, "history entries need a role of 'user' or 'assistant'")
+                session.add(turn["role"], str(turn.get("content", "")))
+
+        reply = await self.collapse(
+            self.request_key("chat", request),
+            self.planner.chat, message, nutrition_goals,
+            dishes, personality,
+            None, session
+        )
+        return {"reply": reply}
+
+    def stats(self):
+        """Cache, upstream and collapsing counters"""
+        return {
+            "cache": self.planner.response_cache.stats(),
+            "upstream_requests": self.planner.llm.requests_sent,
+            "tokens": self.planner.llm.tokens_used,
+            "counters": dict(self.planner.counters),
+            "prompts": {name: dict(stats) for name, stats in self.planner.prompt_stats.items()},
+            "collapsed_requests": self.collapsed,
+            "in_flight": len(self.in_flight)
+        }
+
+    def close(self):
+        """Stop the worker pool and release the planner"""
+        self.executor.shutdown(wait=False)
+        self.planner.close()
+
+
+async def serve(args):
+    # Each worker's /generate fans out into DISH_SHARDS concurrent upstream
+    # requests, so size the connection pool for all of them
+    planner = NutritionPlanner(args.api_key, base_url=args.llm_url, cache_path=args.cache,
+                               pool_size=args.workers * DISH_SHARDS)
+    server = PlannerServer(planner, max_workers=args.workers)
+    listener = await server.start(args.host, args.port)
+    print(f"DNA Buddy API listening on http://{args.host}:{args.port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the DNA Buddy planner over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=8, help="threads for upstream LLM calls")
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY", ""))
+    parser.add_argument("--llm-url", default="https://api.groq.com/openai/v1")
+    parser.add_argument("--cache", default="dna_buddy_cache.db", help="response cache file")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
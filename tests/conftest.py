@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from planner import NutritionPlanner, TokenBucket
+
+
+class FakeLLM:
+    """Local stand-in for the chat completions API (plain and SSE streaming)"""
+
+    def __init__(self):
+        self.reply = "ok"  # text, or a function of the request body
+        self.status = 200
+        self.chunk_delay = 0.0  # seconds between streamed chunks
+        self.headers = {}  # extra headers on error responses (e.g. Retry-After)
+        self.requests = []
+        self.client_ports = set()
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.requests.append(body)
+                    fake.client_ports.add(self.client_address[1])
+                if fake.status != 200:
+                    self._send(fake.status, json.dumps({"error": "fake failure"}).encode(), fake.headers)
+                    return
+
+                text = fake.reply(body) if callable(fake.reply) else fake.reply
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for i in range(0, len(text), 8):
+                        event = {"choices": [{"delta": {"content": text[i:i + 8]}}]}
+                        try:
+                            self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                        except OSError:
+                            return  # client hung up
+                        time.sleep(fake.chunk_delay)
+                    self._chunk(b"data: [DONE]\n\n")
+                    self._chunk(b"")
+                    return
+
+                self._send(200, json.dumps({
+                    "choices": [{"message": {"content": text}}],
+                    "usage": {"total_tokens": 10}
+                }).encode())
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_llm():
+    fake = FakeLLM()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def planner(fake_llm):
+    planner = NutritionPlanner("test-key", base_url=fake_llm.url, read_timeout=5)
+    planner.rate_limiter = TokenBucket(rate=1000, capacity=1000)
+    yield planner
+    planner.close()
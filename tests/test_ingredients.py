@@ -0,0 +1,27 @@
+from planner import IngredientCanonicalizer, RecipeStore
+
+
+def test_keys_keep_whole_phrases():
+    canonicalizer = IngredientCanonicalizer(known=["milk", "rice", "noodle"])
+    assert canonicalizer.canonical("2 lbs boneless chickens") == "chicken"
+    assert canonicalizer.canonical("Almond Milk") == "almond milk"
+    assert canonicalizer.cache_key(["almond milk"]) != canonicalizer.cache_key(["milk"])
+    assert canonicalizer.cache_key(["rice noodles"]) != canonicalizer.cache_key(["egg noodles"])
+    assert canonicalizer.cache_key(["Rice Noodles", "eggs"]) == canonicalizer.cache_key(["egg", "rice noodle"])
+
+
+def test_recipe_matching_falls_back_to_known_suffix(tmp_path):
+    path = tmp_path / "recipes.json"
+    path.write_text('[{"name": "Fried Rice", "ingredients": ["rice", "egg"]}]')
+    store = RecipeStore(str(path))
+    assert store.canonicalizer.match("basmati rice") == "rice"
+    assert [recipe["name"] for recipe in store.find(["basmati rice"])] == ["Fried Rice"]
+
+
+def test_interning_is_bounded_outside_the_vocabulary():
+    canonicalizer = IngredientCanonicalizer(known=["rice"], max_names=4)
+    bits = canonicalizer.bits([f"mystery item {chr(98 + i)}" for i in range(10)])
+    assert len(canonicalizer.names) == 4
+    assert canonicalizer.count(bits) == 3  # "rice" holds one of the slots
+    canonicalizer.learn("quinoa")
+    assert canonicalizer.intern("quinoa") is not None
@@ -0,0 +1,157 @@
+import time
+
+import pytest
+import requests
+
+import planner as planner_module
+from planner import LLMClient, ResponseCache, RetryPolicy, TokenBucket
+
+REQUEST = {"model": "test", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def client(fake_llm):
+    client = LLMClient("test-key", base_url=fake_llm.url, pool_size=2, connect_timeout=1, read_timeout=5)
+    yield client
+    client.close()
+
+
+def test_sequential_requests_reuse_one_connection(client, fake_llm):
+    fake_llm.reply = "hello"
+    for _ in range(5):
+        result = client.chat_completion(REQUEST)
+        assert result["choices"][0]["message"]["content"] == "hello"
+
+    assert len(fake_llm.requests) == 5
+    assert len(fake_llm.client_ports) == 1
+    assert client.requests_sent == 5
+    assert client.tokens_used == 50
+
+
+def test_streaming_yields_deltas(client, fake_llm):
+    fake_llm.reply = "a streamed reply, in pieces"
+    assert "".join(client.stream_chat_completion(REQUEST)) == "a streamed reply, in pieces"
+    assert fake_llm.requests[0]["stream"] is True
+
+
+def test_timeouts_are_separate(client):
+    assert (client.connect_timeout, client.read_timeout) == (1, 5)
+
+
+def test_http_errors_raise(client, fake_llm):
+    fake_llm.status = 503
+    with pytest.raises(requests.HTTPError) as info:
+        client.chat_completion(REQUEST)
+    assert RetryPolicy().is_retryable(info.value)
+
+
+def test_planner_caches_deterministic_prompts(planner, fake_llm):
+    planner.response_cache = ResponseCache(max_entries=8)
+    fake_llm.reply = "cached answer"
+    assert planner.hackclub_ai("same prompt", use_cache=True) == "cached answer"
+    assert planner.hackclub_ai("same prompt", use_cache=True) == "cached answer"
+    assert len(fake_llm.requests) == 1
+
+
+def test_profile_falls_back_only_on_parse_failures(planner, fake_llm):
+    planner.retry_policy = RetryPolicy(retries=2, base_delay=0, max_delay=0)
+    fake_llm.reply = "no numbers here"
+    goals = planner.analyze_profile("profile", "maintenance")
+    assert goals["calories"] == planner_module.DEFAULT_GOALS["calories"]
+
+    # A bad reply followed by an auth failure is an upstream error, not a parse one
+    def junk_then_unauthorized(body):
+        fake_llm.status = 401
+        return "no numbers here"
+
+    fake_llm.reply = junk_then_unauthorized
+    with pytest.raises(Exception) as info:
+        planner.analyze_profile("another profile", "maintenance")
+    assert isinstance(info.value.__cause__, requests.HTTPError)
+
+
+def test_long_rate_limit_resets_fail_without_pausing_everyone(planner, fake_llm):
+    fake_llm.status = 429
+    fake_llm.headers = {"Retry-After": "7200"}
+    with pytest.raises(Exception):
+        planner.hackclub_ai("prompt")
+    assert planner.rate_limiter.blocked_until == 0.0
+    assert len(fake_llm.requests) == 1
+
+    # A short reset is honoured by everyone sharing the limiter
+    fake_llm.headers = {"Retry-After": "0.2"}
+    planner.retry_policy = RetryPolicy(retries=1)
+    with pytest.raises(Exception):
+        planner.hackclub_ai("prompt")
+    assert planner.rate_limiter.blocked_until > 0.0
+
+
+def test_disk_cache_prunes_expired_and_excess_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path=path, ttl=100, max_rows=3, prune_every=2)
+    clock = [1000.0]
+    monkeypatch.setattr(planner_module.time, "time", lambda: clock[0])
+    for i in range(6):
+        clock[0] += 1
+        cache.put(f"key{i}", f"response {i}")
+    rows = [key for key, in cache.db.execute("SELECT key FROM responses ORDER BY created")]
+    assert rows == ["key3", "key4", "key5"]
+    cache.close()
+
+    # Reopening long after the TTL clears the stale rows
+    clock[0] += 1000
+    cache = ResponseCache(path=path, ttl=100)
+    assert cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+    cache.close()
+
+
+def http_error(status, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return requests.HTTPError(response=response)
+
+
+def test_retry_delay_backs_off_within_bounds(monkeypatch):
+    monkeypatch.setattr(planner_module.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert [policy.delay(attempt) for attempt in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Retry-After": "3"}, 3.0),
+    ({"x-ratelimit-reset-requests": "2.5s", "x-ratelimit-reset-tokens": "120ms"}, 2.5),
+    ({"x-ratelimit-reset-tokens": "1m0.5s"}, None),  # past max_delay: give up
+    ({"Retry-After": "7200"}, None),
+])
+def test_retry_delay_honours_server_hints(monkeypatch, headers, expected):
+    monkeypatch.setattr(planner_module.random, "uniform", lambda low, high: 0.0)
+    assert RetryPolicy(max_delay=30.0).delay(0, http_error(429, headers)) == expected
+
+
+def test_only_transient_errors_are_retried():
+    policy = RetryPolicy()
+    assert policy.is_retryable(http_error(429, {}))
+    assert policy.is_retryable(http_error(503, {}))
+    assert policy.is_retryable(requests.Timeout())
+    assert not policy.is_retryable(http_error(401, {}))
+    assert not policy.is_retryable(RuntimeError("bug"))
+
+
+def test_token_bucket_allows_bursts_then_paces():
+    bucket = TokenBucket(rate=20, capacity=3)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09  # two more tokens at 20 per second
+
+
+def test_token_bucket_pause_holds_back_callers():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.1)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
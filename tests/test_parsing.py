@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from planner import DishNameIndex, DishParser
+
+LINES = (
+    "Sure, here you go\n"
+    "1. **Chicken Rice Bowl**: 600 kcal, 45g protein, 70g carbs, 15g fats\n"
+    "- Tofu Stir Fry: 450, 25, 40, 18\n"
+    "Big Burrito: 1,200, 50, 130, 45\n"
+    '{"name": "Egg Scramble", "calories": "320 kcal", "protein": 22, "carbs": 4, "fats": 24}\n'
+    "Mystery Soup: 200, 10\n"
+    "Air: 0, 0, 0, 0\n"
+)
+
+
+def feed_in_chunks(parser, text, size):
+    dishes = []
+    for i in range(0, len(text), size):
+        dishes += parser.feed(text[i:i + size])
+    return dishes + parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 7, len(LINES)])
+def test_line_format_survives_any_chunking(size):
+    parser = DishParser()
+    dishes = feed_in_chunks(parser, LINES, size)
+
+    assert [d["name"] for d in dishes] == ["Chicken Rice Bowl", "Tofu Stir Fry", "Big Burrito", "Egg Scramble"]
+    assert [d["calories"] for d in dishes] == [600, 450, 1200, 320]
+    assert dishes[0]["fats"] == 15
+    assert parser.parsed == 4
+
+    reasons = [reason for _, reason in parser.rejected]
+    assert reasons == [
+        "no ':' between name and nutrients",
+        "expected 4 nutrient values, found 2",
+        "calories must be positive",
+    ]
+
+
+def test_last_line_without_newline_is_parsed_on_close():
+    parser = DishParser()
+    assert parser.feed("Oat Bowl: 350, 12, 60, 7") == []
+    assert [d["name"] for d in parser.close()] == ["Oat Bowl"]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_json_mode_emits_leaf_objects_as_they_close(size):
+    payload = json.dumps({"dishes": [
+        {"name": "Salmon {Teriyaki}", "calories": 520, "protein": 40, "carbs": 35, "fats": 20},
+        {"name": "Lentil \\\"Dal\\\"", "calories": 410, "protein": 24, "carbs": 55, "fats": 9},
+        {"name": "", "calories": 100, "protein": 1, "carbs": 1, "fats": 1},
+    ]})
+    parser = DishParser(mode="json")
+    dishes = feed_in_chunks(parser, payload, size)
+
+    assert [d["name"] for d in dishes] == ["Salmon {Teriyaki}", 'Lentil \\"Dal\\"']
+    assert parser.rejected[0][1] == "empty dish name"
+
+
+def test_json_mode_reports_truncated_output():
+    parser = DishParser(mode="json")
+    parser.feed('{"dishes": [{"name": "Half", "calories": 3')
+    assert parser.close() == []
+    assert parser.rejected[-1][1] == "unterminated JSON object"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Grilled Chicken Salad", "Chicken Salad (Grilled)"),
+    ("Easy Chicken Salads", "chicken salad"),
+    ("Mediterranean Quinoa Chickpea Salad", "Mediteranean Quinoa Chickpea Salad"),
+])
+def test_near_duplicate_names_merge(first, second):
+    names = DishNameIndex()
+    assert names.add({"name": first, "calories": 500})
+    assert not names.add({"name": second, "calories": 520})
+    assert names.canonical(second) == first
+    assert names.merged == 2
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Chicken Curry", "Chickpea Curry"),
+    ("Tofu Scramble", "Egg Scramble"),
+    ("Spaghetti Bolognese", "Spaghetti Bolognaise"),  # similar, but below the threshold
+])
+def test_different_dishes_stay_apart(first, second):
+    names = DishNameIndex()
+    assert names.add({"name": first, "calories": 500})
+    assert names.add({"name": second, "calories": 500})
+    assert len(names.entries) == 2
+
+
+def test_fuzzy_merge_needs_matching_calories():
+    names = DishNameIndex()
+    names.add({"name": "Mediterranean Quinoa Chickpea Salad", "calories": 500})
+    assert names.add({"name": "Mediteranean Quinoa Chickpea Salad", "calories": 900})
+    # Unknown calories only need the names to agree
+    assert not names.add({"name": "Mediterranian Quinoa Chickpea Salad"})
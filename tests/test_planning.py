@@ -0,0 +1,111 @@
+import itertools
+import random
+
+import pytest
+
+import planner as planner_module
+from planner import DayPlanner, WeekPlanner
+
+NUTRIENTS = ("calories", "protein", "carbs", "fats")
+GOALS = [2100, 150, 220, 70]
+
+
+def make_dishes(count, seed):
+    rng = random.Random(seed)
+    return [
+        {"name": f"Dish {i}", "calories": rng.randint(250, 900), "protein": rng.randint(5, 60),
+         "carbs": rng.randint(10, 120), "fats": rng.randint(3, 45)}
+        for i in range(count)
+    ]
+
+
+def brute_force(planner, goals, meals):
+    """Lowest cost over every combination of distinct dishes and their portions"""
+    per_dish = len(planner.portions)
+    best = float("inf")
+    for dishes in itertools.combinations(range(len(planner.dishes)), meals):
+        groups = [range(i * per_dish, (i + 1) * per_dish) for i in dishes]
+        for chosen in itertools.product(*groups):
+            best = min(best, planner.cost(chosen, goals))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("portions", [(1.0,), (0.5, 1.0, 1.5)])
+def test_exact_search_matches_brute_force(seed, portions):
+    dishes = make_dishes(9, seed)
+    rng = random.Random(seed)
+    penalties = [rng.choice([0.0, 0.05, -0.02]) for _ in dishes]
+    planner = DayPlanner(dishes, portions, penalties)
+
+    plan = planner.solve(GOALS, meals=3)
+    assert plan["exact"]
+    assert plan["deviation"] + plan["penalty"] == pytest.approx(brute_force(planner, GOALS, 3))
+    assert len({id(meal["dish"]) for meal in plan["meals"]}) == 3
+
+
+def test_exact_search_without_numpy(monkeypatch):
+    monkeypatch.setattr(planner_module, "np", None)
+    planner = DayPlanner(make_dishes(8, seed=11), (1.0, 2.0))
+    plan = planner.solve(GOALS, meals=2)
+    assert plan["exact"]
+    assert plan["deviation"] == pytest.approx(brute_force(planner, GOALS, 2))
+
+
+def test_zero_goals_are_ignored():
+    planner = DayPlanner(make_dishes(7, seed=3))
+    goals = [2100, 0, 0, 0]
+    plan = planner.solve(goals, meals=3)
+    assert plan["deviation"] == pytest.approx(brute_force(planner, goals, 3))
+
+
+def test_node_cap_returns_best_so_far():
+    planner = DayPlanner(make_dishes(12, seed=5), (0.5, 1.0, 1.5))
+    plan = planner.solve(GOALS, meals=3, max_nodes=10)
+    assert not plan["exact"]
+    assert len(plan["meals"]) == 3
+
+
+def test_too_few_dishes():
+    assert DayPlanner(make_dishes(2, seed=1)).solve(GOALS, meals=3) is None
+
+
+def make_week(days=5, count=24, seed=7, **kwargs):
+    goals = dict(zip(NUTRIENTS, GOALS))
+    week = WeekPlanner(make_dishes(count, seed), goals, days=days, **kwargs)
+    week.plan_week()
+    return week
+
+
+def test_week_never_repeats_dishes_on_neighbouring_days():
+    week = make_week()
+    for day in range(len(week.days) - 1):
+        assert not set(week.assignments[day]) & set(week.assignments[day + 1])
+
+
+def test_swap_replaces_the_meal_and_leaves_other_days_alone():
+    week = make_week()
+    before = [list(assigned) for assigned in week.assignments]
+    swapped = before[2][1]
+
+    plan = week.swap(2, 1)
+
+    assert plan is week.days[2]
+    assert swapped not in week.assignments[2]
+    assert [a for day, a in enumerate(week.assignments) if day != 2] == before[:2] + before[3:]
+    assert not set(week.assignments[2]) & (set(week.assignments[1]) | set(week.assignments[3]))
+
+
+def test_swapped_dishes_stay_banned_from_that_day():
+    week = make_week()
+    removed = set()
+    for _ in range(3):
+        removed.add(week.assignments[0][0])
+        week.swap(0, 0)
+        assert not removed & set(week.assignments[0])
+
+
+def test_small_pools_fall_back_to_penalized_repeats():
+    # Five dishes cannot fill two neighbouring days of three meals without a repeat
+    week = make_week(days=3, count=5)
+    assert all(len(assigned) == 3 for assigned in week.assignments)
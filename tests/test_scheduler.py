@@ -0,0 +1,182 @@
+import threading
+import time
+
+import pytest
+
+from planner import Cancelled, ChatSession, RequestScheduler
+
+GOALS = {"calories": 2100, "protein": 150, "carbs": 220, "fats": 70}
+
+
+def drain_until(scheduler, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the scheduler"
+        scheduler.drain()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(max_workers=4, limits={"generate": 1})
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_cancel_frees_the_slot_of_a_running_job(scheduler):
+    release = threading.Event()
+    started = []
+
+    def stale(cancelled):
+        started.append("stale")
+        release.wait(5)  # ignores the flag, like a blocking upstream call
+
+    scheduler.submit("generate", stale, cancellable=True)
+    drain_until(scheduler, lambda: started)
+    scheduler.cancel("generate")
+
+    done = []
+    scheduler.submit("generate", lambda: "fresh", on_done=done.append)
+    drain_until(scheduler, lambda: done)
+    assert done == ["fresh"]
+    release.set()
+
+
+def test_replacing_a_running_job_frees_its_slot(scheduler):
+    release = threading.Event()
+    started, done = [], []
+    scheduler.submit("generate", lambda: release.wait(5) or started.append("stale"), on_done=done.append)
+    time.sleep(0.05)
+    scheduler.submit("generate", lambda: "fresh", on_done=done.append)
+    drain_until(scheduler, lambda: done)
+    assert done == ["fresh"]
+    release.set()
+
+
+def test_cancellable_jobs_see_the_flag(scheduler):
+    seen = []
+
+    def work(cancelled):
+        seen.append(cancelled)
+        cancelled.wait(5)
+        Cancelled.check(cancelled)
+
+    errors = []
+    scheduler.submit("generate", work, cancellable=True, on_error=errors.append)
+    drain_until(scheduler, lambda: seen)
+    scheduler.cancel("generate")
+    deadline = time.monotonic() + 5
+    while scheduler.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.drain()
+    assert seen[0].is_set()
+    assert errors == []  # cancelled jobs report nothing
+
+
+def test_generate_dishes_stops_streaming_when_cancelled(planner, fake_llm):
+    fake_llm.reply = "".join(f"Dragonfruit Bowl {i}: 450, 20, 70, 9\n" for i in range(40))
+    fake_llm.chunk_delay = 0.02
+    cancelled = threading.Event()
+    outcome = []
+
+    def run():
+        try:
+            planner.generate_dishes(["dragonfruit"], GOALS, cancelled=cancelled)
+        except Cancelled as e:
+            outcome.append(e)
+
+    worker = threading.Thread(target=run)
+    started = time.monotonic()
+    worker.start()
+    time.sleep(0.2)
+    cancelled.set()
+    worker.join(5)
+
+    assert outcome and isinstance(outcome[0], Cancelled)
+    # The full stream takes well over a second at this pace
+    assert time.monotonic() - started < 1.0
+
+
+def test_chat_summaries_run_as_scheduler_jobs(planner, fake_llm):
+    fake_llm.reply = "User is vegetarian."
+    scheduler = RequestScheduler(max_workers=2, limits={"summary": 1})
+    submitted = []
+    submit = scheduler.submit
+    scheduler.submit = lambda kind, *args, **kwargs: submitted.append(kind) or submit(kind, *args, **kwargs)
+    try:
+        session = ChatSession(planner, window=4, scheduler=scheduler)
+        for i in range(8):
+            session.add("user" if i % 2 == 0 else "assistant", f"message {i}")
+        deadline = time.monotonic() + 5
+        while not session.summary and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.shutdown()
+
+    assert submitted and set(submitted) == {"summary"}
+    assert session.summary == "User is vegetarian."
+    assert len(session.turns) == 4
+
+
+def test_identical_requests_share_one_call(scheduler):
+    release = threading.Event()
+    calls, done = [], []
+
+    def work(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    first = scheduler.submit("analyze", work, 21, key="same", on_done=done.append)
+    second = scheduler.submit("analyze", work, 21, key="same", on_done=lambda r: done.append(("again", r)))
+    assert second is first
+    release.set()
+    drain_until(scheduler, lambda: len(done) == 2)
+    assert calls == [21]
+    assert done == [42, ("again", 42)]
+
+
+def test_newer_request_drops_the_queued_one(scheduler):
+    release = threading.Event()
+    done = []
+    scheduler.submit("generate", lambda: release.wait(5) and "first", on_done=done.append, replace=False)
+    queued = scheduler.submit("generate", lambda: "stale", on_done=done.append, replace=False)
+    time.sleep(0.05)
+    scheduler.cancel("generate")
+    assert queued.cancelled.is_set()
+    fresh = scheduler.submit("generate", lambda: "fresh", on_done=done.append)
+    release.set()
+    drain_until(scheduler, lambda: done)
+    time.sleep(0.05)
+    scheduler.drain()
+    assert done == ["fresh"]
+    assert not fresh.cancelled.is_set()
+
+
+def test_errors_reach_on_error(scheduler):
+    errors = []
+
+    def fail():
+        raise ValueError("boom")
+
+    scheduler.submit("analyze", fail, on_error=errors.append)
+    drain_until(scheduler, lambda: errors)
+    assert str(errors[0]) == "boom"
+
+
+def test_kind_limits_are_respected(scheduler):
+    running, peak, done = [0], [0], []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    for _ in range(4):
+        scheduler.submit("generate", work, on_done=done.append, replace=False)
+    drain_until(scheduler, lambda: len(done) == 4)
+    assert peak[0] == 1
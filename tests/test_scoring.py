@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import planner as planner_module
+from planner import DishIndex, NutritionPlanner
+
+NUTRIENTS = ("calories", "protein", "carbs", "fats")
+
+
+@pytest.fixture
+def engine():
+    engine = NutritionPlanner("test-key")
+    yield engine
+    engine.close()
+
+
+def make_recipes(count, seed):
+    rng = random.Random(seed)
+    # Small integer ranges so columns are full of ties
+    return [[rng.randint(200, 260), rng.randint(5, 15), rng.randint(20, 40), rng.randint(5, 12)]
+            for _ in range(count)]
+
+
+def reference_scores(engine, goals, recipes):
+    """calculate_score results back in recipe order"""
+    scores = [None] * len(recipes)
+    for idx, score in engine.calculate_score(goals, recipes):
+        scores[idx] = score
+    return scores
+
+
+GOALS = [
+    [230, 10, 30, 8],
+    [0, 10, 30, 8],
+    [0, 0, 0, 0],
+    [100000, 1, 1, 1],
+    [230.5, 9.5, 30.5, 7.5],  # exactly between two column values
+]
+
+
+@pytest.mark.parametrize("goals", GOALS)
+def test_vectorized_scores_match_reference(engine, goals):
+    recipes = make_recipes(200, seed=1)
+    expected = reference_scores(engine, goals, recipes)
+
+    index = DishIndex([dict(zip(NUTRIENTS, row)) for row in recipes])
+    assert index.scores(goals) == pytest.approx(expected)
+    assert engine.score_recipes(goals, recipes) == pytest.approx(expected)
+
+    if planner_module.np is not None:
+        assert engine.score_batch([goals], recipes)[0].tolist() == pytest.approx(expected)
+
+
+def test_score_batch_matches_reference_for_every_goal_vector(engine):
+    if planner_module.np is None:
+        pytest.skip("NumPy not installed")
+    recipes = make_recipes(120, seed=2)
+    batch = engine.score_batch(GOALS, recipes, block_elements=100)
+    for goals, row in zip(GOALS, batch):
+        assert row.tolist() == pytest.approx(reference_scores(engine, goals, recipes))
+
+
+def test_zero_goals_score_one(engine):
+    recipes = make_recipes(10, seed=3)
+    assert engine.score_many([[0, 0, 0, 0]], recipes) == [[1.0] * 10]
+    assert DishIndex([dict(zip(NUTRIENTS, row)) for row in recipes]).scores([0, 0, 0, 0]) == [1.0] * 10
+
+
+def test_ties_rank_by_index(engine):
+    # Identical rows score identically, so order comes from the index alone
+    recipes = [[250, 10, 30, 8], [400, 30, 10, 20]] * 4
+    goals = [250, 10, 30, 8]
+    reference = engine.calculate_score(goals, recipes)
+
+    assert [idx for idx, _ in reference[:4]] == [0, 2, 4, 6]
+    assert engine.top_k(engine.score_recipes(goals, recipes), 5) == reference[:5]
+    assert engine.top_k_many([goals, goals], recipes, 5) == [reference[:5], reference[:5]]
+
+
+def test_top_k_many_handles_small_k(engine):
+    recipes = make_recipes(5, seed=4)
+    assert engine.top_k_many([GOALS[0]], recipes, 0) == [[]]
+    assert engine.top_k_many([GOALS[0]], recipes, -3) == [[]]
+    assert len(engine.top_k_many([GOALS[0]], recipes, 50)[0]) == 5
+
+
+def test_pure_python_fallback_matches_reference(engine, monkeypatch):
+    monkeypatch.setattr(planner_module, "np", None)
+    recipes = make_recipes(50, seed=5)
+    for goals in GOALS:
+        expected = reference_scores(engine, goals, recipes)
+        assert engine.score_many([goals], recipes)[0] == pytest.approx(expected)
+        assert DishIndex([dict(zip(NUTRIENTS, row)) for row in recipes]).scores(goals) == pytest.approx(expected)
+    assert engine.top_k_many(GOALS[:1], recipes, 3)[0] == engine.calculate_score(GOALS[0], recipes)[:3]
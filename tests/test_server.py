@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+import pytest
+
+from server import PlannerServer
+
+GOALS = {"calories": 2100, "protein": 150, "carbs": 220, "fats": 70}
+DISHES = [
+    {"name": "Chicken Rice", "calories": 600, "protein": 45, "carbs": 70, "fats": 15},
+    {"name": "Tofu Bowl", "calories": 500, "protein": 30, "carbs": 60, "fats": 18},
+]
+
+
+@pytest.fixture
+def api(planner):
+    """PlannerServer on an ephemeral port, running its event loop in a thread"""
+    server = PlannerServer(planner, max_workers=4)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        state["listener"] = loop.run_until_complete(server.start("127.0.0.1", 0))
+        state["port"] = state["listener"].sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(5)
+    server.port = state["port"]
+    yield server
+
+    async def shutdown():
+        state["listener"].close()
+        await state["listener"].wait_closed()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    server.executor.shutdown(wait=False)
+
+
+def call(server, method, path, payload=None):
+    connection = HTTPConnection("127.0.0.1", server.port, timeout=10)
+    try:
+        body = json.dumps(payload).encode() if payload is not None else None
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def profile_reply(body):
+    return json.dumps(dict(GOALS, exercise_plan="Lift three times a week"))
+
+
+def test_analyze_returns_goals(api, fake_llm):
+    fake_llm.reply = profile_reply
+    status, payload = call(api, "POST", "/analyze", {"profile": "ACTN3 RR", "goal": "muscle gain"})
+    assert status == 200
+    assert payload["nutrition_goals"]["protein"] == 150
+
+
+def test_identical_concurrent_requests_collapse(api, fake_llm):
+    def slow_reply(body):
+        time.sleep(0.3)
+        return profile_reply(body)
+
+    fake_llm.reply = slow_reply
+    request = {"profile": "same profile", "goal": "maintenance"}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: call(api, "POST", "/analyze", request), range(4)))
+
+    assert all(status == 200 for status, _ in results)
+    assert len(fake_llm.requests) == 1
+    assert api.collapsed == 3
+
+
+def test_generate_uses_llm_dishes(api, fake_llm):
+    fake_llm.reply = "Dragonfruit Smoothie Bowl: 450, 20, 70, 9\nDragonfruit Salad: 300, 8, 40, 12\n"
+    status, payload = call(api, "POST", "/generate", {
+        "ingredients": ["dragonfruit"], "nutrition_goals": GOALS, "top_k": 3
+    })
+    assert status == 200
+    assert payload["dishes"]
+    assert fake_llm.requests
+
+
+def test_score_ranks_dishes(api):
+    status, payload = call(api, "POST", "/score", {"dishes": DISHES, "nutrition_goals": [GOALS], "top_k": 1})
+    assert status == 200
+    assert payload["top"][0][0]["index"] == 0
+
+    status, payload = call(api, "POST", "/score", {"dishes": DISHES, "goals": [600, 45, 70, 15]})
+    assert status == 200
+    assert payload["scores"][0] == pytest.approx(1.0)
+    assert payload["scores"][1] < 1.0
+
+
+def test_chat_sends_history(api, fake_llm):
+    fake_llm.reply = "Eat more beans."
+    status, payload = call(api, "POST", "/chat", {
+        "message": "What should I eat?", "nutrition_goals": GOALS, "dishes": DISHES,
+        "history": [{"role": "user", "content": "I am vegetarian"}, {"role": "assistant", "content": "Noted."}]
+    })
+    assert status == 200
+    assert payload["reply"] == "Eat more beans."
+    contents = [message["content"] for message in fake_llm.requests[0]["messages"]]
+    assert "I am vegetarian" in contents
+
+
+@pytest.mark.parametrize("path, payload", [
+    ("/generate", {"ingredients": ["rice"], "nutrition_goals": GOALS, "top_k": "x"}),
+    ("/generate", {"ingredients": ["rice"], "nutrition_goals": {"calories": 2000}}),
+    ("/score", {"dishes": DISHES, "goals": [600, 45, 70]}),
+    ("/score", {"dishes": DISHES, "goals": [[600, 45, 70, 15], [1, 2]]}),
+    ("/score", {"dishes": DISHES, "goals": [600, 45, 70, 15], "top_k": "x"}),
+    ("/score", {"dishes": DISHES, "nutrition_goals": [{"calories": 1}]}),
+    ("/score", {"dishes": [{"name": "no numbers"}], "goals": [600, 45, 70, 15]}),
+    ("/chat", {"message": "hi", "nutrition_goals": {"protein": 100}}),
+    ("/chat", {"message": "hi", "dishes": ["not a dish"]}),
+    ("/chat", {"message": "hi", "history": [{"role": "system", "content": "x"}]}),
+    ("/analyze", {}),
+    ("/analyze", {"profile": "ACTN3 RR", "goal": {"not": "a string"}}),
+    ("/generate", {"ingredients": ["  "], "nutrition_goals": GOALS}),
+    ("/generate", {"ingredients": ["rice", 7], "nutrition_goals": GOALS}),
+    ("/generate", {"ingredients": ["rice"], "nutrition_goals": dict(GOALS, calories="nan")}),
+    ("/score", {"dishes": DISHES, "goals": [600, 45, 70, "inf"]}),
+    ("/score", {"dishes": [dict(DISHES[0], fats="nan")], "goals": [600, 45, 70, 15]}),
+    ("/chat", {"message": "hi", "personality": ["grumpy"]}),
+])
+def test_bad_input_is_400(api, fake_llm, path, payload):
+    status, payload = call(api, "POST", path, payload)
+    assert status == 400
+    assert not fake_llm.requests
+
+
+def test_top_k_zero_is_empty(api):
+    status, payload = call(api, "POST", "/score", {"dishes": DISHES, "goals": [600, 45, 70, 15], "top_k": 0})
+    assert status == 200
+    assert payload["top"] == []
+
+
+def test_upstream_failure_is_502(api, fake_llm):
+    fake_llm.status = 401
+    status, payload = call(api, "POST", "/chat", {"message": "hi"})
+    assert status == 502
+    assert "error" in payload
+
+
+def test_routing_errors(api):
+    assert call(api, "POST", "/nope", {})[0] == 404
+    assert call(api, "GET", "/chat")[0] == 405
+    status, payload = call(api, "GET", "/stats")
+    assert status == 200
+    assert "cache" in payload
@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+import pytest
+
+from planner import SessionStore
+
+GOALS = {"calories": 2100, "protein": 150, "carbs": 220, "fats": 70}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_round_trip_through_a_restart(path):
+    store = SessionStore(path)
+    store.new_session()
+    store.save("nutrition_goals", GOALS)
+    store.save("current_dishes", [{"name": "Old"}])
+    store.save("current_dishes", [{"name": "Tofu Bowl", "score": 0.9}])  # coalesced
+    store.append_message("user", "hi")
+    store.append_message("assistant", "hello")
+    store.close()
+
+    reopened = SessionStore(path)
+    try:
+        saved = reopened.latest()
+        assert saved["nutrition_goals"] == GOALS
+        assert saved["current_dishes"] == [{"name": "Tofu Bowl", "score": 0.9}]
+        assert reopened.latest(keys=("nutrition_goals",)) == {"nutrition_goals": GOALS}
+        assert reopened.messages() == [
+            {"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}
+        ]
+    finally:
+        reopened.close()
+
+
+def test_empty_store_has_no_session(path):
+    store = SessionStore(path)
+    try:
+        assert store.latest() is None
+        assert store.messages() == []
+    finally:
+        store.close()
+
+
+def test_compaction_keeps_the_newest_sessions_and_messages(path):
+    store = SessionStore(path, keep_sessions=2, max_messages=3)
+    sessions = []
+    for i in range(4):
+        sessions.append(store.new_session())
+        store.save("ingredients", [f"item {i}"])
+        for n in range(5):
+            store.append_message("user", f"session {i} message {n}")
+        time.sleep(0.01)  # distinct updated times
+    store.compact()
+    store.close()
+
+    db = sqlite3.connect(path)
+    try:
+        kept = {row[0] for row in db.execute("SELECT id FROM sessions")}
+        assert kept == set(sessions[2:])
+        assert {row[0] for row in db.execute("SELECT DISTINCT session_id FROM session_values")} == kept
+        counts = dict(db.execute("SELECT session_id, COUNT(*) FROM messages GROUP BY session_id"))
+        assert counts == {session_id: 3 for session_id in kept}
+    finally:
+        db.close()
+
+    reopened = SessionStore(path, keep_sessions=2, max_messages=3)
+    try:
+        assert reopened.latest() == {"ingredients": ["item 3"]}
+        assert [m["content"] for m in reopened.messages()] == [
+            "session 3 message 2", "session 3 message 3", "session 3 message 4"
+        ]
+    finally:
+        reopened.close()
+
+
+def test_clearing_the_chat_only_affects_the_current_session(path):
+    store = SessionStore(path)
+    first = store.new_session()
+    store.append_message("user", "keep me")
+    time.sleep(0.01)
+    store.new_session()
+    store.append_message("user", "drop me")
+    store.clear_messages()
+    store.close()
+
+    reopened = SessionStore(path)
+    try:
+        assert reopened.latest() == {}
+        assert reopened.session_id != first
+        assert reopened.messages() == []
+        assert reopened.messages(first) == [{"role": "user", "content": "keep me"}]
+    finally:
+        reopened.close()